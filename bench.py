@@ -0,0 +1,370 @@
+#! /usr/bin/python
+#------------------------------------------------------------------
+# bench.py
+#------------------------------------------------------------------
+"""
+ Benchmarks for csv2ibex.py, run on synthetic stimulus and results files.
+"""
+#------------------------------------------------------------------
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+import csv2ibex
+
+#slowdowns smaller than this (in seconds) are treated as noise by --compare
+BENCH_MIN_DIFFERENCE = 0.01
+
+# SYNTHETIC INPUT *****************************************************
+
+def write_stimuli(filename, rows, lists=4, conditions=4, questions=1):
+    """
+    Write a synthetic tab-delimited stimulus file
+    params:
+        * filename:String - name of the file to be created/overwritten
+        * rows:Int - number of stimulus rows
+        * lists:Int - number of distinct 'List' values
+        * conditions:Int - number of critical conditions (fillers are added on top)
+        * questions:Int - number of QuestionN/AnswerN column pairs
+    """
+    cols = [csv2ibex.COL_STIM_ID, csv2ibex.COL_LIST, csv2ibex.COL_ORDER,
+            csv2ibex.COL_TYPE, csv2ibex.COL_CONDITION, csv2ibex.COL_STIMULUS]
+    for n in range(1, questions+1):
+        cols += [csv2ibex.COL_QUESTION+str(n), csv2ibex.COL_ANSWER+str(n)]
+
+    with open(filename, 'w') as fout:
+        fout.write('\t'.join(cols) + '\n')
+        for r in range(rows):
+            lst = r % lists + 1
+            if r % (conditions+1) == conditions:
+                stimType, cond = "filler", "-"
+            else:
+                stimType, cond = "critical", "cond%d" % (r % (conditions+1))
+            fields = ["s%d" % r, str(lst), str(r // lists + 1), stimType, cond,
+                      "The horse@subj jumped over the fence@obj number %d." % r]
+            for n in range(questions):
+                if n % 2: fields += ["Which one?", "yes,no,maybe"];
+                else: fields += ["Did the horse jump?", "Y"];
+            fout.write('\t'.join(fields) + '\n')
+
+def write_results(filename, participants, items=40, words=10):
+    """
+    Write a synthetic Ibex results file: each participant reads every item a
+    region at a time and then answers one question about it. The rows have every
+    Ibex field, including the newline flag and sentence after the tag
+    params:
+        * filename:String - name of the file to be created/overwritten
+        * participants:Int - number of participants
+        * items:Int - items read by each participant
+        * words:Int - regions (words) per item
+    """
+    sentence = "%2C".join(["word%d" % (w) for w in range(1, words+1)]) #as Ibex encodes commas
+    with open(filename, 'w') as fout:
+        fout.write("# Results on synthetic data\n")
+        for p in range(participants):
+            prefix = "%d,md5_%d," % (1280000000 + p, p)
+            fout.write("#\n# participant %d\n" % (p))
+            for i in range(items):
+                cond = "cond%d" % (i % 4)
+                for w in range(1, words+1):
+                    fout.write("%sRegionedSentence,%d,0,%s,NULL,%d,word%d,%d,tag%d,false,%s\n" %
+                               (prefix, i, cond, w, w, 250 + (p * 7 + i * 13 + w * 31) % 400, w % 3, sentence))
+                fout.write("%sQuestion,%d,1,%s,NULL,q,a,%d,%d\n" % (prefix, i, cond, (p + i) % 2, 900 + i))
+
+# TIMING **************************************************************
+
+def time_call(func, *args):
+    """
+    Time a single call, returning (seconds, result)
+    """
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+def bench_item_dict(sizes):
+    """
+    Time generate_item_dict over a range of input sizes
+    return:
+        * List of (rows, seconds) tuples
+    """
+    results = []
+    fd, name = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        for rows in sizes:
+            write_stimuli(name, rows)
+            converter = csv2ibex.Converter("AUTOCONTINUE")
+            secs, dct = time_call(converter.generate_item_dict, name)
+            results.append((rows, secs))
+    finally:
+        os.remove(name)
+    return results
+
+def bench_engines(rows, repeat=3):
+    """
+    Compare the row-at-a-time and columnar input engines on one input size
+    return:
+        * Dictionary {engine name: best time in seconds}
+    """
+    fd, name = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    results = {}
+    try:
+        write_stimuli(name, rows)
+        for engine, columnar in (("rows", False), ("columnar", True)):
+            times = []
+            for n in range(repeat):
+                converter = csv2ibex.Converter("AUTOCONTINUE", csv2ibex.ValidationReport(), columnar)
+                times.append(time_call(converter.generate_item_dict, name)[0])
+            results[engine] = min(times)
+    finally:
+        os.remove(name)
+    return results
+
+def run_phases(stimuli, results, config, workdir):
+    """
+    Run each stage of a conversion and a results formatting once, in order
+    return:
+        * List of (phase, seconds, peak memory in KB so far) tuples
+    """
+    phases = []
+    def record(name, start):
+        phases.append((name, time.time() - start, csv2ibex.peak_memory()))
+
+    start = time.time()
+    csv2ibex.CONFIG_CACHE.clear()
+    dct = csv2ibex.parse_config_file(config)
+    record("config", start)
+
+    converter = csv2ibex.Converter("AUTOCONTINUE", csv2ibex.ValidationReport())
+    start = time.time()
+    items = converter.generate_item_dict(stimuli)
+    record("items", start)
+
+    start = time.time()
+    header = converter.header(dct).render()
+    record("header", start)
+
+    start = time.time()
+    with open(os.path.join(workdir, "data.js"), 'w') as fout:
+        fout = csv2ibex.RetabWriter(fout)
+        fout.write(header + "\n")
+        converter.write_item_str(fout, [items[i] for i in sorted(items)])
+        fout.write("\n\n")
+    record("output", start)
+
+    start = time.time()
+    csv2ibex.format_results(results, os.path.join(workdir, "sentences.csv"),
+                            os.path.join(workdir, "questions.csv"))
+    record("results", start)
+    return phases
+
+def _run_phases_quietly(args):
+    """
+    Pool worker: run_phases in a fresh process, with the converter's messages discarded
+    """
+    saved = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        return run_phases(*args)
+    finally:
+        sys.stdout.close()
+        sys.stdout = saved
+
+def bench_phases(shape, repeat=3):
+    """
+    Time every phase on synthetic inputs of the given shape, each repetition in a
+    fresh process so that peak memory is measured from a clean start
+    params:
+        * shape:Dictionary - rows, lists, conditions, questions, participants
+    return:
+        * Dictionary {"shape": shape, "phases": {phase: {"seconds": best time, "peak_kb": peak memory}}}
+    """
+    from multiprocessing import Pool
+    workdir = tempfile.mkdtemp()
+    stimuli = os.path.join(workdir, "stimuli.csv")
+    results = os.path.join(workdir, "results")
+    config = os.path.join(os.path.dirname(os.path.abspath(__file__)), "default_cfg")
+    write_stimuli(stimuli, shape["rows"], shape["lists"], shape["conditions"], shape["questions"])
+    write_results(results, shape["participants"])
+
+    phases = {}
+    order = []
+    try:
+        for n in range(repeat):
+            pool = Pool(1)
+            try:
+                run = pool.apply(_run_phases_quietly, ((stimuli, results, config, workdir),))
+            finally:
+                pool.close()
+                pool.join()
+            for name, secs, peak in run:
+                if name not in phases:
+                    order.append(name)
+                    phases[name] = {"seconds": secs, "peak_kb": peak}
+                else:
+                    phases[name]["seconds"] = min(secs, phases[name]["seconds"])
+                    phases[name]["peak_kb"] = max(peak, phases[name]["peak_kb"])
+    finally:
+        import shutil
+        shutil.rmtree(workdir)
+    return {"shape": shape, "order": order, "phases": phases,
+            "python": sys.version.split()[0]}
+
+def print_phases(run, baseline=None, threshold=0.10):
+    """
+    Print a phase timing table, compared against an earlier run if one is given
+    return:
+        * List of phases more than 'threshold' (and BENCH_MIN_DIFFERENCE) slower than in the baseline
+    """
+    slower = []
+    if baseline is None:
+        print "%10s %10s %12s" % ("phase", "seconds", "peak MB")
+    else:
+        print "%10s %10s %12s %10s %8s" % ("phase", "seconds", "peak MB", "before", "ratio")
+    for name in run["order"]:
+        phase = run["phases"][name]
+        peak = "-" if phase["peak_kb"] is None else "%.1f" % (phase["peak_kb"] / 1024.0)
+        line = "%10s %10.3f %12s" % (name, phase["seconds"], peak)
+        if baseline is not None and name in baseline["phases"]:
+            before = baseline["phases"][name]["seconds"]
+            ratio = phase["seconds"] / before if before > 0 else 1.0
+            line += " %10.3f %7.2fx" % (before, ratio)
+            if ratio > 1 + threshold and phase["seconds"] - before > BENCH_MIN_DIFFERENCE:
+                line += "  SLOWER"
+                slower.append(name)
+        print line
+    if baseline is not None and baseline["shape"] != run["shape"]:
+        print "Warning: the baseline was run on a different input shape: %s" % (baseline["shape"])
+    return slower
+
+def print_scaling(results):
+    """
+    Print timings along with the per-row cost, which stays flat for linear scaling
+    """
+    print "%10s %10s %14s" % ("rows", "seconds", "usec/row")
+    for rows, secs in results:
+        print "%10d %10.3f %14.2f" % (rows, secs, 1e6 * secs / rows)
+
+def bench_startup(repeat=20):
+    """
+    Time short csv2ibex runs from a fresh interpreter: --help, and -V and -n on a small
+    input, each run as the script and through the module's main(); both should load
+    csv2ibexlib from its compiled .pyc, leaving only the small launcher to compile
+    return:
+        * List of (run name, best time in seconds) tuples, a bare interpreter first
+    """
+    import py_compile
+    import shutil
+    import subprocess
+    here = os.path.dirname(os.path.abspath(csv2ibex.__file__))
+    script = os.path.join(here, "csv2ibex.py")
+    config = os.path.join(here, "default_cfg")
+    #as the first import would, unless bytecode writing is turned off
+    py_compile.compile(os.path.join(here, "csv2ibexlib.py"))
+    workdir = tempfile.mkdtemp()
+    stimuli = os.path.join(workdir, "stimuli.csv")
+    write_stimuli(stimuli, 200)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([here] + [p for p in [env.get("PYTHONPATH")] if p])
+
+    runs = [("interpreter", [sys.executable, "-c", "pass"])]
+    for name, args in (("--help", ["--help"]),
+                       ("-V", ["-V", "-F", stimuli]),
+                       ("-n", ["-n", "-F", "-c", config, stimuli, os.path.join(workdir, "data.js")])):
+        runs.append(("script " + name, [sys.executable, script] + args))
+        runs.append(("main() " + name, [sys.executable, "-c", "import csv2ibex; csv2ibex.main()"] + args))
+    best = dict([(name, None) for name, cmd in runs])
+    try:
+        with open(os.devnull, 'w') as devnull:
+            for n in range(repeat): #interleaved, so a busy moment doesn't land on one run
+                for name, cmd in runs:
+                    start = time.time()
+                    subprocess.call(cmd, stdout=devnull, stderr=subprocess.STDOUT, env=env, cwd=workdir)
+                    secs = time.time() - start
+                    if best[name] is None or secs < best[name]: best[name] = secs;
+    finally:
+        shutil.rmtree(workdir)
+    return [(name, best[name]) for name, cmd in runs]
+
+def print_startup(results):
+    """
+    Print startup timings along with the time each run adds to a bare interpreter
+    """
+    base = results[0][1]
+    print "%14s %10s %10s" % ("run", "msec", "+msec")
+    for name, secs in results:
+        print "%14s %10.1f %10.1f" % (name, 1e3 * secs, 1e3 * (secs - base))
+
+# USER INTERFACE ******************************************************
+
+if __name__=="__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="\t%prog [--max-rows N]\n" +\
+                          "or:\t%prog -e ROWS\n" +\
+                          "or:\t%prog -p [--rows N ...] [--json FILE] [--compare FILE]\n" +\
+                          "or:\t%prog --startup [-r N]",
+                          description="Benchmark csv2ibex on synthetic inputs")
+    parser.add_option("-m", "--max-rows", type="int", dest="maxRows", default=1000000,
+                      help="Largest input size to time (default 1000000)")
+    parser.add_option("-e", "--engines", type="int", dest="engineRows", default=0,
+                      help="Instead, compare the row and columnar input engines on this many rows")
+    parser.add_option("-p", "--phases", action="store_true", dest="phases", default=False,
+                      help="Instead, time each phase (config, items, header, output, results) with its peak memory")
+    parser.add_option("--rows", type="int", dest="rows", default=100000,
+                      help="Stimulus rows for -p (default 100000)")
+    parser.add_option("--lists", type="int", dest="lists", default=4,
+                      help="Distinct List values for -p (default 4)")
+    parser.add_option("--conditions", type="int", dest="conditions", default=4,
+                      help="Critical conditions for -p (default 4)")
+    parser.add_option("--questions", type="int", dest="questions", default=1,
+                      help="QuestionN/AnswerN column pairs for -p (default 1)")
+    parser.add_option("--participants", type="int", dest="participants", default=500,
+                      help="Participants in the results file for -p (default 500)")
+    parser.add_option("-r", "--repeat", type="int", dest="repeat", default=None,
+                      help="Repetitions for -p and --startup; the best time is kept (default 3 and 20)")
+    parser.add_option("--startup", action="store_true", dest="startup", default=False,
+                      help="Instead, time short runs (--help, -V, -n) of the script and of main() against a bare interpreter")
+    parser.add_option("--json", dest="json", default=None,
+                      help="Save the -p timings to this JSON file")
+    parser.add_option("--compare", dest="compare", default=None,
+                      help="Compare the -p timings with a JSON file saved earlier; exits with status 1 on a regression")
+    parser.add_option("--threshold", type="float", dest="threshold", default=0.10,
+                      help="Slowdown counted as a regression by --compare (default 0.10)")
+    (options, args) = parser.parse_args()
+
+    if options.phases:
+        shape = {"rows": options.rows, "lists": options.lists, "conditions": options.conditions,
+                 "questions": options.questions, "participants": options.participants}
+        run = bench_phases(shape, options.repeat or 3)
+        baseline = None
+        if options.compare:
+            with open(options.compare, 'r') as fin:
+                baseline = json.load(fin)
+        slower = print_phases(run, baseline, options.threshold)
+        if options.json:
+            with open(options.json, 'w') as fout:
+                json.dump(run, fout, indent=2, sort_keys=True)
+        sys.exit(int(len(slower) > 0))
+
+    if options.startup:
+        print_startup(bench_startup(options.repeat or 20))
+        sys.exit(0)
+
+    if options.engineRows:
+        results = bench_engines(options.engineRows)
+        for engine in sorted(results):
+            print "%10s %10.3f s" % (engine, results[engine])
+        print "speedup: %.2fx" % (results["rows"] / results["columnar"])
+        sys.exit(0)
+
+    sizes = []
+    rows = 1000
+    while rows <= options.maxRows:
+        sizes.append(rows)
+        rows *= 10
+    print_scaling(bench_item_dict(sizes))
@@ -0,0 +1,3068 @@
+#------------------------------------------------------------------
+# csv2ibexlib.py
+#------------------------------------------------------------------
+# Author: Andrew Wood <andywood@vt.edu>
+# Modified by: Andrew Watts <awatts@bcs.rochester.edu>
+#
+# HLP/Jaeger Lab
+# University of Rochester
+# 08/28/2010
+#------------------------------------------------------------------
+"""
+ Converts a tab-delimited CSV file to a Javascript input file for
+   Ibex (formerly webSPR) web-based self-paced reading
+   software, available at http://code.google.com/p/webspr/
+   under the New BSD License.
+
+ This is the implementation; csv2ibex.py is the command to run, and
+   "import csv2ibex" gives this module.
+"""
+#------------------------------------------------------------------
+
+import csv
+import re
+import sys
+
+# GLOBALS *************************************************************
+#changed in script
+Criticals = []
+Non_Criticals = [] #should only end up with 'practice' and 'filler' (for now)
+ListSet = set() #list of "list" index numbers
+
+#not changeable by config or cmdline
+END_PUNCTUATION = ['.', '!', '?']
+IGNORED_VALUES = ["", "NA", "N/A", "-", None]
+ITEM_FMT_STRINGS = { \
+                    'FULL_ITEM' : '[["{itemName}",[{gpNum},{gpDepend}]], ds, {{s: "{rs}"}}, {qs}]', \
+                    'GPNUM_ONLY': '[["{itemName}",{gpNum}], ds, {{s: "{rs}"}}, {qs}]', \
+                    'NO_GROUP'  : '["{itemName}", ds, {{s: "{rs}"}}, {qs}]' \
+                    }
+
+#editable from config or cmdline (TODO)
+ITEMS_HEADER = '[\n\t["sr", "__SendResults__", { }]\n\t'+\
+        '["sep", "Separator", {}],\n\t' +\
+        '["intro", "Message", {consentRequired: true, html: {include: "intro.html"}}],\n\t' +\
+        '["info", "Form", {html: {include: "info.html"}}],'
+ITEMS_FOOTER = '\t["contact", "Message", {consentRequired: false, html: {include: "contacts.html"}}]\n\t'+\
+        '["code", "Message", {consentRequired: false, html: {include: "code.html"}}]'
+ITEMS_PRACTICE = '\t["startprac", "Message", {consentRequired: false, html: {include: "start_practice.html"}}]\n\t'+\
+        '["endprac", "Message", {consentRequired: false, html: {include: "end_practice.html"}}]'
+
+COL_STIMULUS = "Stimulus"
+COL_STIM_ID = "StimulusID"
+COL_LIST = "List"
+COL_ORDER = "TrialOrder"
+COL_TYPE = "StimulusType"
+COL_CONDITION = "Condition"
+COL_QUESTION = "Question"
+COL_ANSWER = "Answer"
+
+
+# UTILITY *************************************************************
+qExitOpt = "PROMPT"
+
+def qExit(msg, option = "PROMPT"):
+    """
+    Display a message and prompt the user if they would like to continue
+    Can pass option to auto fail or auto continue
+    """
+    if option == "AUTOFAIL":
+        print msg + "...STOPPING"
+        sys.exit(1);
+    elif option == "AUTOCONTINUE":
+        print msg
+        return
+
+    c = raw_input(msg + "\nWould you like to continue anyway? (y/n): ")
+    if c.upper() == 'Y' or c.upper() == "YES": return
+    else: sys.exit(1)
+
+# TODO: there is probably a saner way to do this.
+def check_file(filename):
+    """
+    check if a file exists and is openable
+    """
+    try:
+        f = open(filename).close()
+    except IOError:
+        print "\nERROR: Unable to open file '"+filename+"'\n"
+        sys.exit(1)
+
+def check_punctuation(sentence):
+    """
+    Check that a given string ends in an acceptable ending punctuation
+     - @ tags are ignored in this evaluation, unless one is found at the end of the tag
+     - return:
+       * true if punctuation found in the right place,
+       * false if no punctuation found at all,
+       * suggested replacement if punctuation found at end of tag
+    """
+    words = sentence.split(" ")
+    lastword = words[-1].split("@")[0]
+    if lastword[-1] in END_PUNCTUATION:
+        return True
+    else:
+        if(words[-1][-1] in END_PUNCTUATION):
+            #    word-tag + last character + the tag minus the last character
+            return lastword+words[-1][-1]+words[-1][len(lastword):-1]
+        return False
+
+# TIMING **************************************************************
+
+class PhaseTimer(object):
+    """
+    Wall time, rows handled and peak memory of each phase of a run (--timings).
+    Code that is timed checks for a timer first, so a run without one costs nothing extra
+    """
+    def __init__(self):
+        import time
+        self.clock = time.time
+        self.created = self.clock()
+        self.phases = [] #(name, start, seconds, rows, peak KB)
+        self.current = None
+
+    def begin(self, name):
+        self.current = (name, self.clock())
+
+    def end(self, rows=None):
+        name, start = self.current
+        self.phases.append((name, start - self.created, self.clock() - start, rows, peak_memory()))
+        self.current = None
+
+    def print_report(self, fout=sys.stdout):
+        """
+        Print a table of the phases: seconds, rows, rows per second and peak memory so far
+        """
+        fout.write("%-10s %10s %10s %12s %10s\n" % ("phase", "seconds", "rows", "rows/s", "peak MB"))
+        total = 0.0
+        for name, start, secs, rows, peak in self.phases:
+            total += secs
+            rate = "-"
+            if rows is not None and secs > 0: rate = "%.0f" % (rows / secs);
+            fout.write("%-10s %10.3f %10s %12s %10s\n" % (name, secs, "-" if rows is None else rows, rate,
+                                                          "-" if peak is None else "%.1f" % (peak / 1024.0)))
+        fout.write("%-10s %10.3f\n" % ("total", total))
+
+    def write_json(self, filename):
+        """
+        Save the phases as a JSON trace (times in seconds from the start of the run)
+        """
+        import json
+        with open(filename, 'w') as fout:
+            json.dump([{"phase": name, "start": start, "seconds": secs, "rows": rows, "peak_kb": peak}
+                       for name, start, secs, rows, peak in self.phases], fout, indent=1)
+
+def peak_memory():
+    """
+    Peak resident memory of this process so far in kilobytes, or None where unknown
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin': peak /= 1024; #reported in bytes there
+    return peak
+
+# HEADER GENERATION ***************************************************
+
+QUOTED = re.compile(r"""("[^"]*"?|'[^']*'?)""")
+
+def remove_whitespace(s):
+    """
+    Simple method to remove tabs and spaces from non-quote strings
+     - a single pass: the line is split into quoted and unquoted runs, and only the
+       unquoted ones (the even-numbered parts) are stripped
+    """
+    parts = QUOTED.split(s)
+    parts[::2] = [p.replace(' ', '').replace('\t', '') for p in parts[::2]]
+    return ''.join(parts)
+
+def parse_config_lines(lines):
+    """
+    Parse the lines of a configuration file (see parse_config_file)
+    """
+    outDict = {}
+    defStr = ["var defaults = ["]
+    curDef = []
+    mode = "vars" #Options are 'vars' 'defaults'
+    for line in lines:
+        #remove whitespace and comment
+        line = line[:-1]
+        l = remove_whitespace(line)
+        if l=="": continue;
+        if l[0] == '#': continue;
+
+        #handle the different kinds of input
+        pairs = l.split(":")
+
+        if(pairs[0]=="VARS" and pairs[1]==""):
+            mode ="vars"
+            continue
+        elif(pairs[0]=="DEFAULTS" and pairs[1]==""):
+            mode ="defaults"
+            continue
+        elif(pairs[1]==""):
+            if curDef:
+                defStr.append(''.join(curDef)[:-1] + " },")
+            curDef = ["\n\t\""+pairs[0]+"\", {"]
+            continue
+
+        #Handle actual varables
+        if(mode == "vars"):
+            outDict[pairs[0]] = pairs[1]
+        elif(mode == "defaults"):
+            curDef.append("\n\t\t"+ pairs[0] + ": " + pairs[1] + ",")
+        else:
+            pass
+    defStr.append(''.join(curDef)[:-1] + " }\n];")
+    outDict["defaults"] = ''.join(defStr)
+    return outDict
+
+CONFIG_CACHE = {} #absolute path -> (mtime, size, content hash or None, parsed dictionary)
+
+def parse_config_file(conf, cachedir=None):
+    """
+    params:
+      * conf:String - name of the input configuration file
+      * cachedir:String - optional directory for parsed configs, shared between runs
+    return:
+      * dictionary with following entries:
+        * inputfile:String - the name of the default input file (used if one isn't specified on command line)
+        * outputfile:String - name of the default output file (used if one isn't specified on command line)
+        * filler:String - how to treat fillers
+        * order:String - the shuffleSeq that describes the order of the items
+        * defaults:String - the item defaults: see the hlp wiki(FIXME: url here) for specifics
+    Parsed configs are kept in memory for the life of the process (and in cachedir, if
+    given), so each config is only parsed once; callers get their own copy to modify.
+    """
+    import cStringIO
+    import os
+
+    check_file(conf)
+    path = os.path.abspath(conf)
+    st = os.stat(path)
+    cached = CONFIG_CACHE.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime, st.st_size):
+        return dict(cached[3])
+
+    with open(conf, 'r') as fin:
+        content = fin.read()
+    digest = None #only needed to compare with a cached parse, so one-off runs skip hashlib
+    if cached is not None or cachedir:
+        import hashlib
+        digest = hashlib.sha1(content).hexdigest()
+    if cached is not None and cached[2] == digest:
+        outDict = cached[3]
+    else:
+        outDict = None
+        if cachedir:
+            outDict = load_cached_config(cachedir, digest)
+        if outDict is None:
+            outDict = parse_config_lines(cStringIO.StringIO(content))
+            if cachedir:
+                save_cached_config(cachedir, digest, outDict)
+    CONFIG_CACHE[path] = (st.st_mtime, st.st_size, digest, outDict)
+    return dict(outDict)
+
+def load_cached_config(cachedir, digest):
+    """
+    Return a parsed config stored by save_cached_config, or None
+    """
+    import cPickle
+    import os
+    try:
+        with open(os.path.join(cachedir, "config-" + digest + ".cache"), 'rb') as fin:
+            data = cPickle.load(fin)
+    except (IOError, EOFError, cPickle.UnpicklingError):
+        return None
+    if data.get("version") != CACHE_VERSION: return None;
+    return data["config"]
+
+def save_cached_config(cachedir, digest, outDict):
+    """
+    Store a parsed config under the hash of its file contents
+    """
+    import cPickle
+    import os
+    if not os.path.isdir(cachedir):
+        os.makedirs(cachedir)
+    with open(os.path.join(cachedir, "config-" + digest + ".cache"), 'wb') as fout:
+        cPickle.dump({"version": CACHE_VERSION, "config": outDict}, fout, cPickle.HIGHEST_PROTOCOL)
+
+#shuffleSequence for each filler mode and order; %s is the list of critical item names
+SEQUENCE_TEMPLATES = {
+    "SEP_EACH": {
+        "ORDERED" : 'shuffle(randomize("filler"), anyOf(%s))',
+        "SHUFFLE" : 'shuffle(randomize("filler"), shuffle(%s))',
+        "RANDOM" : 'shuffle(randomize("filler"), seq(randomize(%s)))',
+        "RSHUFFLE" : 'shuffle(randomize("filler"), rshuffle(%s))'
+    },
+    "ITEM": {
+        "ORDERED" : 'anyOf("filler", %s)',
+        "SHUFFLE" : 'shuffle("filler",%s)',
+        "RANDOM" : 'randomize(anyOf("filler",%s))',
+        "RSHUFFLE" : 'rshuffle("filler",%s)'
+    }
+}
+HEADER_TEMPLATE = 'var shuffleSequence = seq("intro", "info", "practice", sepWith("sep", %s), "contact", "sr", "code");\n\n'+\
+    'var ds = "RegionedSentence";\n'+\
+    'var qs = "Question";\n\n'+\
+    'var manualSendResults = true;\n\n' +\
+    '%s;'
+class Header(object):
+    """
+    The parts of an output file header (order and filler modes, controller defaults
+    and critical item names), rendered to a string once they are all known
+     - critical names can be added as they are discovered; the rendered text is
+       kept until the header changes
+    """
+    __slots__ = ('order', 'filler', 'defaults', 'criticals', '_seen', '_text')
+
+    def __init__(self, order, filler, defaults, criticals=()):
+        if order == "RANDOMIZE": order = "RANDOM"; #the name used by -r and the README
+        self.order = order
+        self.filler = filler
+        self.defaults = defaults
+        self.criticals = []
+        self._seen = set()
+        self._text = None
+        self.update(criticals)
+
+    @classmethod
+    def from_config(cls, dct, criticals=()):
+        """
+        Header for a dictionary from parse_config_file
+        """
+        return cls(dct["order"], dct["filler"], dct["defaults"], criticals)
+
+    def add_critical(self, name):
+        if name not in self._seen:
+            self._seen.add(name)
+            self.criticals.append(name)
+            self._text = None
+
+    def update(self, names):
+        for name in names:
+            self.add_critical(name)
+
+    def sequence(self):
+        """
+        The shuffleSequence argument; with no critical names yet it keeps a '%s'
+        placeholder for fill_header
+        """
+        seq = SEQUENCE_TEMPLATES["SEP_EACH" if self.filler == "SEP_EACH" else "ITEM"][self.order]
+        if self.criticals:
+            seq = seq % (','.join(['"{0}"'.format(js_string(c)) for c in self.criticals]))
+        return seq
+
+    def render(self):
+        """
+        The header as a js string
+        """
+        if self._text is None:
+            self._text = HEADER_TEMPLATE % (self.sequence(), self.defaults)
+        return self._text
+
+    __str__ = render
+
+def format_header(dct):
+    """
+    convert the header dictionary into a js string, using the module-level converter.
+    It is strongly recommended to run generate_item_dict first
+    """
+    return _default.format_header(dct)
+
+def generate_header_cnf(conf):
+    """
+    Wrapper for the parse_config_file method that generates a formatted string rather than a dictionary.    
+    params:
+      * conf:String - name of the input config file
+    return:
+      * String header (formatted)
+    """
+    d = parse_config_file(conf)
+    return format_header(d)
+def generate_header_dct(dct):
+    """
+    Wrapper for the parse_config_file method that generates a formatted string rather than a dictionary.    
+    params:
+      * dct: - dict gathered from parse_config_file
+    return:
+      * String header (formatted)
+    """
+    return format_header(dct)
+
+#order and filler modes a multi-variant build (--variants) can combine
+VARIANT_ORDERS = ("ORDERED", "SHUFFLE", "RANDOM", "RSHUFFLE")
+VARIANT_FILLERS = ("SEP_EACH", "ITEM")
+
+def variant_outputs(spec, outfile, filler="SEP_EACH"):
+    """
+    Output files for a multi-variant build
+    params:
+        * spec:String - "all" for every order and filler mode, or a comma-separated list
+                        of ORDER or ORDER:FILLER (e.g. "SHUFFLE:ITEM,RSHUFFLE")
+        * outfile:String - output file name the variant names are made from:
+                           data.js gives data-shuffle-item.js, ...
+        * filler:String - filler mode for variants that don't give one
+    return:
+        * List of (output file name, order, filler) tuples, in the order given (without repeats)
+    raises ValueError for an unknown order or filler mode
+    """
+    import os
+    if spec.strip().lower() == "all":
+        variants = [(order, fill) for fill in VARIANT_FILLERS for order in VARIANT_ORDERS]
+    else:
+        variants = []
+        for part in spec.split(","):
+            order, sep, fill = part.strip().upper().partition(":")
+            if order == "RANDOMIZE": order = "RANDOM";
+            if order not in VARIANT_ORDERS:
+                raise ValueError("unknown order '%s' (use one of %s)" % (order, ", ".join(VARIANT_ORDERS)))
+            fill = fill or filler
+            if fill not in VARIANT_FILLERS:
+                raise ValueError("unknown filler mode '%s' (use one of %s)" % (fill, ", ".join(VARIANT_FILLERS)))
+            if (order, fill) not in variants: variants.append((order, fill));
+    root, ext = os.path.splitext(outfile)
+    return [("%s-%s-%s%s" % (root, order.lower(), fill.lower(), ext), order, fill) for order, fill in variants]
+
+# ITEM CACHE **********************************************************
+
+CACHE_VERSION = 9
+
+class ItemCache(object):
+    """
+    On-disk cache of parsed input rows for one input file, so that a rerun only
+    re-parses the rows that changed.
+     - rows are keyed by their text in the input file, and keep the problems found in them so
+       those are still reported; the stimulus ID in those messages is left as ID_MARK
+       and filled in on replay, as it depends on the row's position when there is no
+       'StimulusID' column
+     - the whole cache is dropped when the input columns or the item formatting
+       constants change
+     - if the whole input file is unchanged the finished items are reused, along with
+       the problems reported for it; items that were spilled to disk by an ItemSorter
+       are not kept, so this needs the file's items to fit in ITEM_BUFFER_SIZE
+    """
+    ID_MARK = "\0ID\0"
+
+    def __init__(self, cachedir, infile):
+        import hashlib
+        import os
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+        name = hashlib.sha1(os.path.abspath(infile)).hexdigest()
+        self.path = os.path.join(cachedir, name + ".cache")
+        self.infile = infile
+        self.schema = None
+        self.size = None
+        self.digest = hashlib.sha1() #of the lines read, so an edited file isn't read twice
+        self.rows = {}
+        self.items = None
+        self.criticals = []
+        self.lists = []
+        self.notes = []
+        self.rowsRead = 0
+        self.newRows = {}
+        self.lines = []
+
+    def reader(self, fin):
+        """
+        DictReader over an open input file that keeps the text of the row being read, for row_key
+        """
+        append = self.lines.append
+        update = self.digest.update
+        def lines():
+            for line in fin:
+                append(line)
+                update(line)
+                yield line
+        return RowReader(lines(), delimiter='\t')
+
+    def load(self, fieldnames):
+        """
+        Load the cache file, discarding it if it was built for a different schema
+        return:
+            * True if the input file is unchanged since the cache was written
+        """
+        import cPickle
+        import os
+        self.schema = self.schema_hash(fieldnames)
+        self.size = os.path.getsize(self.infile)
+        del self.lines[:] #the header row
+        try:
+            with open(self.path, 'rb') as fin:
+                data = cPickle.load(fin)
+            if data.get("schema") != self.schema:
+                return False
+            if data["items"] is not None and data["size"] == self.size and data["file"] == hash_file(self.infile):
+                self.items = [(key, Item(*fields)) for key, fields in cPickle.loads(data["items"])]
+                self.criticals = data["criticals"]
+                self.lists = data["lists"]
+                self.notes = data["notes"]
+                self.rowsRead = data["rowsRead"]
+                return True
+            self.rows = cPickle.loads(data["rows"])
+        except (IOError, EOFError, cPickle.UnpicklingError, AttributeError, ImportError):
+            pass #unreadable, or from a version that pickled classes: rebuilt by save
+        return False
+
+    def save(self, items, criticals, lists, notes, rowsRead):
+        """
+        Write the rows seen in this run (only) along with the finished items, once the
+        reader has read the whole input file
+        """
+        import cPickle
+        import cStringIO
+        def dumps(obj):
+            out = cStringIO.StringIO()
+            pickler = cPickle.Pickler(out, cPickle.HIGHEST_PROTOCOL)
+            pickler.fast = 1 #no memo: the rows share nothing worth it, and it is most of the cost
+            pickler.dump(obj)
+            return out.getvalue()
+        #the rows and items are pickled apart, so that load only unpickles the ones it uses;
+        #items as plain tuples, so the cache doesn't depend on where Item is defined
+        if items is not None:
+            items = dumps([(key, (item.stimType, item.order, item.lst, item.stimulus, item.questions))
+                           for key, item in items.iteritems()])
+        data = {"schema": self.schema, "file": self.digest.hexdigest(), "size": self.size,
+                "rows": dumps(self.newRows), "items": items,
+                "criticals": criticals, "lists": lists, "notes": notes, "rowsRead": rowsRead}
+        with open(self.path, 'wb') as fout:
+            cPickle.dump(data, fout, cPickle.HIGHEST_PROTOCOL)
+
+    def row_key(self):
+        """
+        Key of the row last returned by the reader: its text, which may span several
+        lines (quoted fields, or blank lines skipped before it)
+        """
+        key = ''.join(self.lines)
+        del self.lines[:]
+        return key
+
+    @staticmethod
+    def schema_hash(fieldnames):
+        """
+        Hash of everything other than the row itself that affects parse_item
+        """
+        import hashlib
+        return hashlib.sha1(repr((CACHE_VERSION, fieldnames, sorted(ITEM_FMT_STRINGS.items()),
+                                  END_PUNCTUATION, IGNORED_VALUES))).hexdigest()
+
+def hash_file(filename):
+    """
+    Return the SHA1 hex digest of a file's contents
+    """
+    import hashlib
+    h = hashlib.sha1()
+    with open(filename, 'rb') as fin:
+        for block in iter(lambda: fin.read(1 << 20), ""):
+            h.update(block)
+    return h.hexdigest()
+
+# ITEM GENERATION *****************************************************
+
+def format_answer(answer):
+    """
+    Format the answer options of a question: Y/N for yes/no questions, otherwise a
+    comma-separated list of choices with the correct answer first
+    """
+    #determine type of question (yes/no vs multiple choice)
+    if(answer.upper() == "Y" or answer.upper() == "N"):
+        if(answer.upper() == "Y"):
+            return ', hasCorrect: "Yes", randomOrder: false'
+        else:
+            return ', hasCorrect: "No", randomOrder: false'
+    return ', as :[' + ','.join(['"'+js_string(a)+'"' for a in answer.split(',')]) + '], randomOrder: true'
+
+def js_string(s):
+    """
+    Escape a string for use inside a double-quoted JavaScript string literal
+    """
+    if '\\' in s: s = s.replace('\\', '\\\\');
+    if '"' in s: s = s.replace('"', '\\"');
+    if '\n' in s or '\r' in s: s = s.replace('\n', '\\n').replace('\r', '\\r');
+    return s
+
+def list_key(lst):
+    """
+    Sort key for a 'List' label: numeric labels in numeric order, then any others by name.
+    The label itself is part of the key, so that e.g. "1" and "1.0" stay separate lists
+    """
+    try:
+        n = float(lst)
+    except ValueError:
+        return (float("inf"), lst)
+    if n != n: return (float("inf"), lst); #"nan"
+    return (n, lst)
+
+class Item(object):
+    """
+    Compact record of one experiment item, serialized to JS only when it is written
+     - questions is a tuple of (question, answer) pairs, answers as given in the input
+    """
+    __slots__ = ('stimType', 'order', 'lst', 'stimulus', 'questions')
+
+    def __init__(self, stimType, order, lst, stimulus, questions=()):
+        self.stimType = stimType
+        self.order = order
+        self.lst = lst
+        self.stimulus = stimulus
+        self.questions = questions
+
+    def __reduce__(self):
+        return (Item, (self.stimType, self.order, self.lst, self.stimulus, self.questions))
+
+    def __eq__(self, other):
+        return isinstance(other, Item) and self.__reduce__() == other.__reduce__()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def js(self):
+        """
+        The item as an element of the Ibex 'items' array
+        """
+        #determine which format the item falls under
+        if self.stimType == "filler" or self.stimType == "practice":
+            fmt = ITEM_FMT_STRINGS["GPNUM_ONLY"]
+        elif self.order is None:
+            fmt = ITEM_FMT_STRINGS["NO_GROUP"]
+        else:
+            fmt = ITEM_FMT_STRINGS["FULL_ITEM"]
+        qs = ''.join(['\n\t\tqs, {q: "%s" %s},' % (js_string(q), format_answer(a)) for q, a in self.questions])
+        return fmt.format(itemName=js_string(self.stimType), gpNum=self.order, gpDepend=0,
+                          rs=js_string(self.stimulus), qs=qs)
+
+    __str__ = js
+
+class RowReader(csv.DictReader):
+    """
+    csv.DictReader that also counts the blank rows it skips, so that self.rows is
+    the spreadsheet row number of the row it last returned (the header is row 1)
+    """
+    class Counter(object):
+        def __init__(self, reader):
+            self.reader = reader
+            self.rows = 0
+
+        def __iter__(self):
+            return self
+
+        def next(self):
+            row = self.reader.next()
+            self.rows += 1
+            return row
+
+        @property
+        def line_num(self):
+            return self.reader.line_num
+
+    def __init__(self, f, *args, **kwds):
+        csv.DictReader.__init__(self, f, *args, **kwds)
+        self.reader = self.Counter(self.reader)
+
+    @property
+    def rows(self):
+        return self.reader.rows
+
+def read_columns(infile, rowNums=None):
+    """
+    Load a tab-separated file into columns
+    params:
+        * infile:String - name of the input tab-separated file
+        * rowNums:List - if given, the spreadsheet row number of each row is appended to it
+    return:
+        * Tuple (fieldnames, Dictionary {fieldname: list of values}); like csv.DictReader,
+          blank lines are skipped and missing trailing fields are None
+    """
+    with open(infile, 'r') as csvin:
+        reader = csv.reader(csvin, delimiter='\t')
+        try:
+            fieldnames = reader.next()
+        except StopIteration:
+            return ([], {})
+        width = len(fieldnames)
+        rows = [(n, row) for n, row in enumerate(reader, 2) if row]
+        if rowNums is not None: rowNums.extend([n for n, row in rows]);
+        rows = [row if len(row) >= width else row + [None]*(width-len(row)) for n, row in rows]
+    columns = dict(zip(fieldnames, [list(c) for c in zip(*rows)] if rows else [[] for f in fieldnames]))
+    return (fieldnames, columns)
+
+def parse_item(line, ID, option="PROMPT", issues=None):
+    """
+    Validate and format the fields of a single input row that don't depend on other rows
+    params:
+        * line:Dictionary - one row from the input file
+        * ID:String - the stimulus identifier, used in warnings
+        * option:String - how qExit should handle problems (see qExit)
+        * issues:List - if given, problems are appended to it as (column, code, message, error)
+                        tuples instead of being printed or prompted for
+    return:
+        * Tuple (stimType, stimulus, questions), or None if the stimulus is blank;
+          questions is a tuple of (question, answer) pairs
+    """
+    def note(column, code, message, error=False):
+        if issues is not None: issues.append((column, code, message, error))
+        elif error: qExit(message, option)
+        else: print message
+
+    #STIMULUS
+    try:
+        stimulus = line[COL_STIMULUS].strip()
+        if stimulus == "":
+            note(COL_STIMULUS, "BLANK_STIMULUS", "Warning: Blank stimulus: "+ID, True)
+            return None
+        chk = check_punctuation(stimulus)
+        if not chk:
+            note(COL_STIMULUS, "NO_PUNCTUATION", "Warning: no ending punctuation for stimulusID  %s" % (ID))
+        elif chk is not True:
+            #then chk is a suggestion. Replace the last word with the fixed punctuation location
+            replaceIndex = len(stimulus)-len(chk)
+            replaced = stimulus[replaceIndex:]
+            stimulus = stimulus[:replaceIndex]+chk
+
+            note(COL_STIMULUS, "MISPLACED_PUNCTUATION",
+                 "Warning: misplaced punctuation at stimulusID {}: replaced '{}' with '{}'".format(ID, replaced, chk))
+    except KeyError:
+        print "ERROR: No 'Stimulus' column...\n\t-required to build an experiment!"
+        sys.exit(1)
+
+    #TYPE
+    try:
+        stimType = line[COL_TYPE]
+    except KeyError:
+        stimType = "defaultStim"
+
+    #CONDITION (overwrites type, unless it's '-'
+    try:
+        if(not line[COL_CONDITION].upper() in IGNORED_VALUES):
+            stimType = line[COL_CONDITION]
+    except KeyError:
+        note(COL_CONDITION, "NO_CONDITION_COLUMN", "Warning: conditions not specified, using 'defaultStim'")
+
+    #QUESTIONs and ANSWERs
+    questionComplete = False
+    questions = []
+    i = 1
+    while True:  #loop until no more questions are found
+        try:
+            question = line[COL_QUESTION+str(i)]
+            answer = line[COL_ANSWER+str(i)]
+            
+            #make sure both the QuestionN and AnswerN fields have a value                    
+            existsAnswer = answer not in IGNORED_VALUES
+            existsQuestion = question not in IGNORED_VALUES
+
+            if existsQuestion and not existsAnswer:
+                note(COL_ANSWER+str(i), "NO_ANSWER",
+                     "WARNING at stimuli %s, question %d: No answer present for question" % (ID, i), True)
+                raise KeyError
+            elif existsAnswer and not existsQuestion:
+                note(COL_QUESTION+str(i), "NO_QUESTION",
+                     "WARNING at stimuli %s, question %d: No question, but answer exists" % (ID, i), True)
+                raise KeyError
+            elif not (existsAnswer and existsQuestion): #Don't display if question or answer is missing
+                raise KeyError
+            else:
+                questionComplete = True
+
+            questions.append((question, answer))
+
+        except KeyError:
+            if not questionComplete:
+                note(COL_QUESTION+str(i), "NO_QUESTIONS",
+                     "No question/answer pair found for stimulus %s , using only stimulus." % (ID))
+            break
+        i += 1
+
+    return (stimType, stimulus, tuple(questions))
+
+def generate_item_dict(infile, cache=None):
+    """
+    params:
+        * infile:String - name of the input tab-separated file
+        * cache:ItemCache - optional cache of previously parsed rows
+    return:
+        * Dictionary of items in format {key: (order, list_key(list)), value: Item}
+    """
+    _default.qExitOpt = qExitOpt
+    return _default.generate_item_dict(infile, cache)
+
+
+def generate_item_str(infile, cache=None):
+    """
+    params:
+        * infile:String - name of the input tab-separated file
+        * cache:ItemCache - optional cache of previously parsed rows
+    return:
+        * String containing the 'items' structure
+    """
+    _default.qExitOpt = qExitOpt
+    return _default.generate_item_str(infile, cache)
+
+# OUTPUT FILE CREATION **************************************************************
+
+class RetabWriter(object):
+    """
+    Wraps a writable file and expands every tab to four spaces as the text goes
+    through, so the output is written once, already re-indented (this used to be a
+    separate pass by the 'tab' module over the finished file)
+    """
+    def __init__(self, fout, tab='\t', spaces='    '):
+        self.fout = fout
+        self.tab = tab
+        self.spaces = spaces
+
+    def write(self, data):
+        self.fout.write(data.replace(self.tab, self.spaces))
+
+def fill_header(header, criticals):
+    """
+    Substitute the critical item names into a header that still has a placeholder
+    """
+    if len(criticals) > 0:
+        try:
+            header = header % ','.join(['"{0}"'.format(js_string(item)) for item in criticals])
+        except TypeError:
+            pass
+    return header
+
+def render_outfile(header, items, footer="", criticals=()):
+    """
+    Build the full contents of an output file
+    params:
+        * header:String - the file header
+        * items:String - the items string
+        * footer:String - file footer
+        * criticals:List - critical item names, substituted into the header if it still has a placeholder
+    return:
+        * String contents of the file
+    """
+    return "{0}\n{1}\n{2}\n".format(fill_header(header, criticals), items, footer)
+
+def create_outfile(outfile, header, items, footer="", criticals=None):
+    """
+    simple wrapper to create an output file (can be used for more than just ibex files...)
+    params:
+        * outfile:String - name of the file to be created/overwritten
+        * header:String - the file header
+        * items:String - the items string
+        * footer:String - file footer
+        * criticals:List - critical item names (defaults to the module-level Criticals)
+    return: nothing (creates output file)
+    """
+    if criticals is None: criticals = Criticals;
+    with open(outfile, 'w') as fout:
+        fout.write(render_outfile(header, items, footer, criticals))
+    print "File '" + outfile + "' sucessfully created"
+
+
+# VALIDATION ************************************************************************
+
+class ValidationReport(object):
+    """
+    Collects the problems found in an input file in one pass, instead of prompting
+    or printing as each one is found.
+     - each issue is (row, column, code, message, error), where row is the spreadsheet
+       row number (the header is row 1) or None for problems with the whole file, and
+       error is True for the problems qExit would otherwise prompt for
+     - problems with the whole file (missing columns) are only recorded once
+    """
+    FIELDS = ["row", "column", "code", "error", "message"]
+    FILE_CODES = set(["NO_ID_COLUMN", "NO_LIST_COLUMN", "NO_ORDER_COLUMN", "NO_CONDITION_COLUMN"])
+
+    def __init__(self, filename=None):
+        self.issues = []
+        self.fileIssues = set()
+        self.filename = filename #where finish() writes the report, if anywhere
+
+    def add(self, row, column, code, message, error=False):
+        if code in self.FILE_CODES: row = None;
+        if row is None:
+            if (column, code) in self.fileIssues: return;
+            self.fileIssues.add((column, code))
+        self.issues.append((row, column, code, message, error))
+
+    def errors(self):
+        """
+        Number of issues that need attention (see apply_policy)
+        """
+        return len([i for i in self.issues if i[4]])
+
+    def write(self, filename):
+        """
+        Write the issues to a JSON file (if filename ends in '.json') or a tab-delimited file
+        """
+        with open(filename, 'w') as fout:
+            if filename.lower().endswith(".json"):
+                import json
+                json.dump([dict(zip(self.FIELDS, (r, c, code, e, m))) for r, c, code, m, e in self.issues],
+                          fout, indent=1)
+                fout.write("\n")
+            else:
+                writer = csv.writer(fout, delimiter='\t', lineterminator='\n')
+                writer.writerow(self.FIELDS)
+                for r, c, code, m, e in self.issues:
+                    writer.writerow(["" if r is None else r, c, code, int(e), m])
+
+    def print_summary(self, limit=10):
+        """
+        Print the number of issues of each kind and the first few of them
+        """
+        if not self.issues:
+            print "Validation: no problems found"
+            return
+        counts = {}
+        for issue in self.issues:
+            counts[issue[2]] = counts.get(issue[2], 0) + 1
+        print "Validation: %d problem(s), %d needing attention" % (len(self.issues), self.errors())
+        for code in sorted(counts):
+            print "  %-24s %d" % (code, counts[code])
+        for r, c, code, m, e in self.issues[:limit]:
+            print "  row %s: %s" % ("-" if r is None else r, m)
+        if len(self.issues) > limit:
+            print "  ... and %d more" % (len(self.issues) - limit)
+
+    def apply_policy(self, option="PROMPT"):
+        """
+        Decide whether to carry on after validation, using the qExit options:
+        AUTOFAIL stops if anything needs attention, AUTOCONTINUE always carries on
+        and PROMPT asks once, or stops if there is no terminal to ask on
+        """
+        if self.errors():
+            msg = "%d problem(s) in the input need attention" % (self.errors())
+            if option == "PROMPT" and not sys.stdin.isatty():
+                msg += " (use -F to carry on without a terminal)"
+                option = "AUTOFAIL"
+            qExit(msg, option)
+
+    def finish(self, option=None):
+        """
+        Print the summary, write the report file if one was asked for, and then
+        apply the policy (if an option is given)
+        """
+        self.print_summary()
+        if self.filename:
+            self.write(self.filename)
+            print "Validation report written to '%s'" % (self.filename)
+        if option is not None:
+            self.apply_policy(option)
+
+
+class NullItems(object):
+    """
+    Stands in for the item dictionary when only validating
+    """
+    def __setitem__(self, key, item):
+        pass
+
+
+# ITEM SORTING **********************************************************************
+
+ITEM_BUFFER_SIZE = 200000
+ITEM_MAX_RUNS = 64
+
+class ItemSorter(object):
+    """
+    Dictionary-like store of output items that yields them back in key order.
+     - like a dict, setting an existing key replaces its item
+     - once more than maxItems are held, they are written to a sorted temporary
+       file (a "run") and the runs are merged back by items()
+    """
+    def __init__(self, maxItems=None):
+        if maxItems is None: maxItems = ITEM_BUFFER_SIZE;
+        self.maxItems = maxItems
+        self.buffer = {}
+        self.runs = []
+
+    def __setitem__(self, key, item):
+        self.buffer[key] = item
+        if len(self.buffer) >= self.maxItems:
+            self.spill()
+
+    def spill(self):
+        """
+        Write the buffered items to a sorted temporary run file
+        """
+        self.runs.append(self._write_run((key, self.buffer[key]) for key in sorted(self.buffer)))
+        self.buffer = {}
+        if len(self.runs) >= ITEM_MAX_RUNS:
+            #too many open runs: merge them into one
+            runs = self.runs
+            self.runs = [self._write_run(self._merge([self._read_run(run, count, n)
+                                                      for n, (run, count) in enumerate(runs)]))]
+            for run, count in runs:
+                run.close()
+
+    def _write_run(self, records):
+        import cPickle
+        import tempfile
+        run = tempfile.TemporaryFile()
+        pickler = cPickle.Pickler(run, cPickle.HIGHEST_PROTOCOL)
+        pickler.fast = True #no memo: every record is written out in full
+        count = 0
+        for record in records:
+            pickler.dump(record)
+            count += 1
+        return (run, count)
+
+    def _read_run(self, run, count, index):
+        import cPickle
+        run.seek(0)
+        unpickler = cPickle.Unpickler(run)
+        for n in xrange(count):
+            key, item = unpickler.load()
+            yield (key, index, item)
+
+    def _merge(self, streams):
+        """
+        Merge sorted (key, run index, item) streams into (key, item) pairs; where a
+        key was set more than once the item from the latest run wins
+        """
+        import heapq
+        prev = None
+        for key, index, item in heapq.merge(*streams):
+            #equal keys arrive in run order, so only emit once a key is finished
+            if prev is not None and prev[0] != key:
+                yield prev
+            prev = (key, item)
+        if prev is not None:
+            yield prev
+
+    def items(self):
+        """
+        Return an iterator over every item in key order; the items held in memory
+        are sorted straight away, any runs are merged as it is read
+        """
+        keys = sorted(self.buffer)
+        buffer = self.buffer
+        if not self.runs:
+            return (buffer[key] for key in keys)
+        streams = [self._read_run(run, count, n) for n, (run, count) in enumerate(self.runs)]
+        last = len(streams)
+        streams.append(((key, last, buffer[key]) for key in keys))
+        return (item for key, item in self._merge(streams))
+
+    def close(self):
+        """
+        Remove any temporary run files
+        """
+        for run, count in self.runs:
+            run.close()
+        self.runs = []
+
+
+# CONVERTER *************************************************************************
+
+class Converter(object):
+    """
+    Holds the state of one conversion (critical item names, lists, warning policy),
+    so that several experiments can be converted in one process, or in threads,
+    without state carrying over from one to the next.
+
+    Typical use:
+        js = Converter("AUTOCONTINUE").convert("input.csv", "default_cfg")
+    """
+    def __init__(self, qExitOpt="PROMPT", report=None, columnar=False, timer=None, jobs=1):
+        self.criticals = []
+        self.nonCriticals = [] #should only end up with 'practice' and 'filler' (for now)
+        self.listSet = set() #list of "list" index numbers
+        self.qExitOpt = qExitOpt
+        self.report = report #a ValidationReport collects problems instead of qExit
+        self.columnar = columnar #read uncached input files a column at a time
+        self.timer = timer #a PhaseTimer, if write_outfile should time its phases
+        self.jobs = jobs #processes for generating uncached, row-at-a-time input files
+        self.rowsRead = 0 #input rows in the last generate_item_dict
+
+    def note(self, row, column, code, message, error=False):
+        """
+        Record a problem with the input: add it to the report if there is one,
+        otherwise prompt (errors) or print (warnings) right away
+        """
+        if self.report is not None: self.report.add(row, column, code, message, error)
+        elif error: qExit(message, self.qExitOpt)
+        else: print message
+
+    def header(self, dct):
+        """
+        Header object for a config dictionary, with this converter's critical item names
+        """
+        return Header.from_config(dct, self.criticals)
+
+    def format_header(self, dct):
+        """
+        convert the header dictionary into a js string.
+        It is strongly recommended to run generate_item_dict first
+        """
+        if "defaults" not in dct:
+            print "WARNING: invalid header dictionary...returning a NoneType"
+            return None
+        return self.header(dct).render()
+
+    def generate_item_dict(self, infile, cache=None, outputLines=None, rowIDs=None):
+        """
+        params:
+            * infile:String - name of the input tab-separated file, or a list of row dictionaries
+            * cache:ItemCache - optional cache of previously parsed rows (file input only)
+            * outputLines:Dictionary or ItemSorter - where to put the items (default: a new dict)
+            * rowIDs:Iterator - (row number, stimulus ID) for each row, if the caller has
+                                already checked the IDs (see generate_item_dict_parallel)
+        return:
+            * Dictionary of items in format {key: (order, list_key(list)), value: Item}
+        """
+        import gc
+        if self.columnar and cache is None and isinstance(infile, basestring):
+            return self.generate_item_dict_columnar(infile, outputLines)
+        if self.jobs > 1 and cache is None and isinstance(infile, basestring):
+            check_file(infile)
+            items = self.generate_item_dict_parallel(infile, outputLines)
+            if items is not None: return items;
+        if isinstance(infile, basestring):
+            check_file(infile)
+            csvin = open(infile, 'r')
+            if cache is not None: inputdata = cache.reader(csvin);
+            else: inputdata = RowReader(csvin, delimiter='\t')
+        else:
+            csvin = None
+            inputdata = iter(infile)
+            cache = None #only files can be cached
+
+        listWarning = False
+        orderWarning = False
+
+        firstCritical = -1
+        defaultOrder = 0
+        orderCounters = {}
+        if outputLines is None: outputLines = {};
+        idSet = set()
+        criticalSet = set(self.criticals) #mirrors self.criticals, which keeps first-seen order for the shuffleSequence
+        fileCriticals = [] #first-seen order within this file, for the cache
+        fileCriticalSet = set()
+        fileLists = set()
+        IDcount = 2
+
+        note = self.note
+        fileNotes = [] #(row, column, code, message, error) for the cache, to be replayed
+        if cache is not None:
+            def note(*args):
+                fileNotes.append(args)
+                self.note(*args)
+
+        collecting = gc.isenabled()
+        if cache is not None: gc.disable(); #the cached rows are long-lived; collecting among them only costs time
+        try:
+            if cache is not None:
+                if cache.load(inputdata.fieldnames):
+                    for args in cache.notes:
+                        self.note(*args)
+                    IDcount += cache.rowsRead
+                    for c in cache.criticals:
+                        if c not in criticalSet:
+                            criticalSet.add(c)
+                            self.criticals.append(c)
+                    self.listSet.update(cache.lists)
+                    for key, item in cache.items:
+                        outputLines[key] = item
+                    return outputLines
+                rows = cache.rows
+                newRows = cache.newRows
+
+            for line in inputdata:
+                #format fields (based on what fields do or don't exist in the input file)
+        
+                rowNum = inputdata.rows if csvin is not None else IDcount #spreadsheet row number
+
+                #STIMULUS ID
+                if rowIDs is not None:
+                    rowNum, ID = rowIDs.next()
+                else:
+                    try:
+                        if line[COL_STIM_ID] in idSet:
+                            note(rowNum, COL_STIM_ID, "DUPLICATE_ID",
+                                      "Warning: non-unique Stimulus Identifier: %s" %(line[COL_STIM_ID]), True)
+                        else:
+                            if line[COL_STIM_ID] == None or line[COL_STIM_ID] == "":
+                                note(rowNum, COL_STIM_ID, "BLANK_ID", "Warning: Blank Stimulus Identifier encountered", True)
+                            idSet.add(line[COL_STIM_ID])
+                            ID = line[COL_STIM_ID]
+                    except KeyError:
+                        if not idSet:
+                            note(None, COL_STIM_ID, "NO_ID_COLUMN", "Warning: no Stimulus Identifiers provided.", True)
+                            idSet.add("NONE")
+                        ID = "stim"+str(IDcount)
+                IDcount += 1
+
+                #LIST
+                try:
+                    lst = line[COL_LIST]
+                except KeyError:
+                    if not listWarning: note(None, COL_LIST, "NO_LIST_COLUMN", "Warning: No 'List' column present, using one list.")
+                    lst = 1
+                self.listSet.add(lst)
+                fileLists.add(lst)
+
+                #STIMULUS, TYPE, CONDITION, QUESTIONs and ANSWERs
+                if cache is None:
+                    issues = []
+                    parsed = parse_item(line, ID, self.qExitOpt, issues)
+                else:
+                    key = cache.row_key()
+                    try:
+                        parsed, issues = rows[key]
+                    except KeyError:
+                        issues = []
+                        parsed = parse_item(line, ItemCache.ID_MARK, self.qExitOpt, issues)
+                        issues = tuple(issues)
+                    newRows[key] = (parsed, issues)
+                    if issues:
+                        issues = [(column, code, message.replace(ItemCache.ID_MARK, str(ID)), error)
+                                  for column, code, message, error in issues]
+                for column, code, message, error in issues:
+                    note(rowNum, column, code, message, error)
+                if parsed is None: continue;
+                stimType, stimulus, questions = parsed
+
+                #ORDER
+                try:
+                    order = int(line[COL_ORDER])
+                    if order == "" or order == None:
+                        note(rowNum, COL_ORDER, "BLANK_ORDER", "Warning: blank order at stimuli: %s" % (ID), True)
+                except KeyError:
+                    if not orderWarning:
+                        note(None, COL_ORDER, "NO_ORDER_COLUMN", "Warning: order not specified, using default ordering (1,2,3,...).")
+                        orderWarning = True
+                    try:
+                        order = orderCounters[lst]
+                    except KeyError:
+                        order = orderCounters[lst] = 1  #if it's the first item of a list
+                    orderCounters[lst] = orderCounters[lst]+1
+
+                #update the item list for use in shuffleSeq
+                if(not (stimType == "practice" or stimType == "filler")):
+                    if stimType in criticalSet:
+                        if firstCritical == -1: firstCritical == order;
+                    else:
+                        criticalSet.add(stimType)
+                        self.criticals.append(stimType)
+                    if stimType not in fileCriticalSet:
+                        fileCriticalSet.add(stimType)
+                        fileCriticals.append(stimType)
+                else:
+                    lst = 0 ##make sure that there is only one of each
+
+                #Build output dictionary ----
+                # update dict, enforcing unique items (also by 'lst = 0' above)
+                # - sorts by order, then list; a tuple so that lists >= 10 can't collide with the next order
+                i = (order, list_key(lst))
+        
+                outputLines[i] = Item(stimType, order, lst, stimulus, questions)
+
+            if cache is not None:
+                #only real items are cached: not those an ItemSorter has spilled to disk, nor NullItems
+                items = None
+                if isinstance(outputLines, ItemSorter):
+                    if not outputLines.runs: items = outputLines.buffer;
+                elif isinstance(outputLines, dict): items = outputLines
+                cache.save(items, fileCriticals, fileLists, fileNotes, IDcount - 2)
+        finally:
+            if csvin is not None: csvin.close();
+            if collecting: gc.enable();
+            self.rowsRead = IDcount - 2
+        return outputLines
+
+    def generate_item_dict_parallel(self, infile, outputLines=None):
+        """
+        generate_item_dict for an input file, with the rows of each 'List' generated in a
+        pool of self.jobs processes; stimulus IDs are checked here, and the lists merged in
+        input order, so the items, criticals and notes are those of a single process
+        return:
+            * Dictionary or ItemSorter of items, as from generate_item_dict
+            * None if the file can't be split by line (no rows, no 'Stimulus' column
+              or quoted fields, which may span lines) or there is only one processor
+        """
+        import gc
+        from multiprocessing import Pool, cpu_count
+        jobs = min(self.jobs, cpu_count())
+        if jobs < 2:
+            return None
+        with open(infile, 'r') as csvin:
+            text = csvin.read()
+        if text.startswith('"') or '\t"' in text or '\n"' in text:
+            return None
+        lines = [line + '\n' for line in text.split('\n')] #as iterating over the file splits
+        del text
+        if len(lines) < 2:
+            return None
+        fieldnames = csv.reader(lines[:1], delimiter='\t').next()
+        if COL_STIMULUS not in fieldnames:
+            return None
+        #as DictReader skips empty lines, keeping each row's spreadsheet row number (no quotes: one line each)
+        rows = [n for n, line in enumerate(lines[1:], 2) if line.rstrip('\r\n')]
+        lines = [line for line in lines[1:] if line.rstrip('\r\n')]
+
+        #STIMULUS ID: the same checks as generate_item_dict, over the whole file;
+        #LIST: one task per list, in order of first appearance
+        idColumn = fieldnames.index(COL_STIM_ID) if COL_STIM_ID in fieldnames else None
+        listColumn = fieldnames.index(COL_LIST) if COL_LIST in fieldnames else None
+        width = max(idColumn, listColumn, -1) + 1
+        padding = [None] * width #short rows get None, as from DictReader
+        notes = []
+        if idColumn is None and lines:
+            notes.append((0, None, COL_STIM_ID, "NO_ID_COLUMN", "Warning: no Stimulus Identifiers provided.", True))
+        idSet = set()
+        ID = None
+        lst = 1
+        groups = {}
+        tasks = []
+        for r, line in enumerate(lines):
+            fields = line.rstrip('\r\n').split('\t', width)
+            if len(fields) < width: fields += padding;
+            if idColumn is None:
+                ID = "stim"+str(r+2)
+            elif fields[idColumn] in idSet:
+                notes.append((r, rows[r], COL_STIM_ID, "DUPLICATE_ID",
+                              "Warning: non-unique Stimulus Identifier: %s" %(fields[idColumn]), True))
+            else:
+                ID = fields[idColumn]
+                if ID == None or ID == "":
+                    notes.append((r, rows[r], COL_STIM_ID, "BLANK_ID", "Warning: Blank Stimulus Identifier encountered", True))
+                idSet.add(ID)
+            if listColumn is not None: lst = fields[listColumn];
+            try:
+                group = groups[lst]
+            except KeyError:
+                group = groups[lst] = ([], [], [], []) #row indices, row numbers, IDs and lines
+                tasks.append((fieldnames, group, self.qExitOpt))
+            group[0].append(r)
+            group[1].append(rows[r])
+            group[2].append(ID)
+            group[3].append(line)
+
+        items = []
+        criticals = []
+        rowNotes = []
+        fileNotes = {} #code: (first row index, task) of file-level notes, which a single pass gives once
+        collecting = gc.isenabled()
+        gc.disable() #the items are long-lived; collecting while they arrive only costs time
+        pool = Pool(jobs)
+        try:
+            for task, result in enumerate(pool.imap(_generate_rows, tasks)):
+                taskNotes, taskItems, taskCriticals, taskLists = result
+                for note in taskNotes:
+                    if note[1] is None and (note[3] not in fileNotes or note[0] < fileNotes[note[3]][0]):
+                        fileNotes[note[3]] = (note[0], task)
+                    rowNotes.append((task, note))
+                items.extend(taskItems)
+                criticals.extend(taskCriticals)
+                self.listSet.update(taskLists)
+        finally:
+            pool.close()
+            pool.join()
+            if collecting: gc.enable();
+
+        #merge in input order (sorts are stable, so a row's ID note stays first)
+        notes.extend([note for task, note in rowNotes if note[1] is not None or fileNotes[note[3]][1] == task])
+        notes.sort(key=lambda note: note[0])
+        for r, row, column, code, message, error in notes:
+            self.note(row, column, code, message, error)
+        criticals.sort()
+        criticalSet = set(self.criticals)
+        for r, name in criticals:
+            if name not in criticalSet:
+                criticalSet.add(name)
+                self.criticals.append(name)
+        items.sort(key=lambda item: item[0])
+        if outputLines is None: outputLines = {};
+        for r, key, item in items:
+            outputLines[key] = item
+        self.rowsRead = len(lines)
+        return outputLines
+
+    def generate_item_dict_columnar(self, infile, outputLines=None):
+        """
+        Column-at-a-time version of generate_item_dict, producing the same items and
+        problems (reported in the same order, once the whole file has been read)
+        params:
+            * infile:String - name of the input tab-separated file
+            * outputLines:Dictionary or ItemSorter - where to put the items (default: a new dict)
+        return:
+            * Dictionary of items in format {key: (order, list_key(list)), value: Item}
+        """
+        check_file(infile)
+        if outputLines is None: outputLines = {};
+        rowNums = [] #spreadsheet row numbers: the header is row 1
+        fieldnames, columns = read_columns(infile, rowNums)
+        n = len(columns[fieldnames[0]]) if fieldnames else 0
+        self.rowsRead = n
+        if n == 0: return outputLines;
+        rowIssues = [[] for r in xrange(n)]
+
+        #STIMULUS ID
+        if COL_STIM_ID in columns:
+            ids = []
+            idSet = set()
+            ID = None
+            for r, v in enumerate(columns[COL_STIM_ID]):
+                if v in idSet:
+                    rowIssues[r].append((COL_STIM_ID, "DUPLICATE_ID", "Warning: non-unique Stimulus Identifier: %s" %(v), True))
+                else:
+                    if v == None or v == "":
+                        rowIssues[r].append((COL_STIM_ID, "BLANK_ID", "Warning: Blank Stimulus Identifier encountered", True))
+                    idSet.add(v)
+                    ID = v
+                ids.append(ID)
+        else:
+            rowIssues[0].append((COL_STIM_ID, "NO_ID_COLUMN", "Warning: no Stimulus Identifiers provided.", True))
+            ids = ["stim"+str(r) for r in xrange(2, n+2)]
+
+        #LIST
+        if COL_LIST in columns:
+            lists = columns[COL_LIST]
+        else:
+            lists = [1]*n
+            for issues in rowIssues:
+                issues.append((COL_LIST, "NO_LIST_COLUMN", "Warning: No 'List' column present, using one list.", False))
+        self.listSet.update(lists)
+
+        #STIMULUS (rows with a blank stimulus are dropped from here on)
+        if COL_STIMULUS not in columns:
+            for r in xrange(len(rowIssues[0])): self.note(rowNums[0], *rowIssues[0][r]);
+            print "ERROR: No 'Stimulus' column...\n\t-required to build an experiment!"
+            sys.exit(1)
+        stimuli = [v.strip() for v in columns[COL_STIMULUS]]
+        keep = [r for r in xrange(n) if stimuli[r] != ""]
+        for r in xrange(n):
+            if stimuli[r] == "":
+                rowIssues[r].append((COL_STIMULUS, "BLANK_STIMULUS", "Warning: Blank stimulus: "+ids[r], True))
+        checks = [check_punctuation(stimuli[r]) for r in keep]
+        for r, chk in zip(keep, checks):
+            if not chk:
+                rowIssues[r].append((COL_STIMULUS, "NO_PUNCTUATION", "Warning: no ending punctuation for stimulusID  %s" % (ids[r])))
+            elif chk is not True:
+                stimulus = stimuli[r]
+                replaceIndex = len(stimulus)-len(chk)
+                stimuli[r] = stimulus[:replaceIndex]+chk
+                rowIssues[r].append((COL_STIMULUS, "MISPLACED_PUNCTUATION",
+                    "Warning: misplaced punctuation at stimulusID {}: replaced '{}' with '{}'".format(ids[r], stimulus[replaceIndex:], chk)))
+
+        #TYPE and CONDITION (overwrites type, unless it's '-'
+        types = columns[COL_TYPE] if COL_TYPE in columns else ["defaultStim"]*n
+        if COL_CONDITION in columns:
+            types = [c if c.upper() not in IGNORED_VALUES else t for t, c in zip(types, columns[COL_CONDITION])]
+        else:
+            for r in keep:
+                rowIssues[r].append((COL_CONDITION, "NO_CONDITION_COLUMN", "Warning: conditions not specified, using 'defaultStim'", False))
+
+        #QUESTIONs and ANSWERs: a row stops at its first incomplete pair
+        questions = [()]*n
+        active = keep
+        i = 1
+        while active:
+            qcol = COL_QUESTION+str(i)
+            acol = COL_ANSWER+str(i)
+            if qcol in columns and acol in columns:
+                qs = columns[qcol]
+                ans = columns[acol]
+                stillActive = []
+                for r in active:
+                    existsQuestion = qs[r] not in IGNORED_VALUES
+                    existsAnswer = ans[r] not in IGNORED_VALUES
+                    if existsQuestion and existsAnswer:
+                        questions[r] += ((qs[r], ans[r]),)
+                        stillActive.append(r)
+                        continue
+                    if existsQuestion:
+                        rowIssues[r].append((acol, "NO_ANSWER",
+                            "WARNING at stimuli %s, question %d: No answer present for question" % (ids[r], i), True))
+                    elif existsAnswer:
+                        rowIssues[r].append((qcol, "NO_QUESTION",
+                            "WARNING at stimuli %s, question %d: No question, but answer exists" % (ids[r], i), True))
+                    if i == 1:
+                        rowIssues[r].append((qcol, "NO_QUESTIONS",
+                            "No question/answer pair found for stimulus %s , using only stimulus." % (ids[r])))
+            else:
+                stillActive = []
+                if i == 1:
+                    for r in active:
+                        rowIssues[r].append((qcol, "NO_QUESTIONS",
+                            "No question/answer pair found for stimulus %s , using only stimulus." % (ids[r])))
+            active = stillActive
+            i += 1
+
+        #ORDER
+        if COL_ORDER in columns:
+            orders = columns[COL_ORDER]
+            orders = dict([(r, int(orders[r])) for r in keep])
+        else:
+            orders = {}
+            orderCounters = {}
+            for r in keep:
+                lst = lists[r]
+                orders[r] = orderCounters[lst] = orderCounters.get(lst, 0) + 1
+            if keep:
+                rowIssues[keep[0]].append((COL_ORDER, "NO_ORDER_COLUMN", "Warning: order not specified, using default ordering (1,2,3,...).", False))
+
+        #report everything, in row order
+        for r in xrange(n):
+            for issue in rowIssues[r]:
+                self.note(rowNums[r], *issue)
+
+        #update the item list for use in shuffleSeq, and build the item records
+        criticalSet = set(self.criticals)
+        for r in keep:
+            stimType = types[r]
+            order = orders[r]
+            if stimType == "practice" or stimType == "filler":
+                outputLines[(order, list_key(0))] = Item(stimType, order, 0, stimuli[r], questions[r])
+            else:
+                if stimType not in criticalSet:
+                    criticalSet.add(stimType)
+                    self.criticals.append(stimType)
+                outputLines[(order, list_key(lists[r]))] = Item(stimType, order, lists[r], stimuli[r], questions[r])
+        return outputLines
+
+    def generate_item_str(self, infile, cache=None):
+        """
+        params:
+            * infile:String - name of the input tab-separated file
+            * cache:ItemCache - optional cache of previously parsed rows
+        return:
+            * String containing the 'items' structure
+        """
+        import cStringIO
+        dct = self.generate_item_dict(infile, cache)
+        buf = cStringIO.StringIO()
+        self.write_item_str(buf, [dct[i] for i in sorted(dct)])
+        return buf.getvalue()
+
+    def write_item_str(self, fout, items):
+        """
+        Write the 'items' structure to an open file, one item at a time
+        params:
+            * fout:File - writable handle
+            * items:Iterable - Item records (or strings), already in output order
+        return:
+            * number of items written
+        """
+        fout.write('\nvar items = [' + ITEMS_HEADER)
+    
+        if 'practice' in self.nonCriticals:
+            fout.write(ITEMS_PRACTICE)
+        
+        fout.write("\n\t"+'\n\t'.join(['[["list_ordering", 0], "Separator", {}],' for i in range(len(self.listSet))]))
+
+        fout.write("\n\t")
+        sep = ""
+        count = 0
+        for item in items:
+            fout.write(sep)
+            fout.write(str(item))
+            sep = "\n\t"
+            count += 1
+        fout.write("\n"+ITEMS_FOOTER + '\n]')
+        return count
+
+    def write_outfile(self, outfile, infile, dct, cache=None, maxItems=None, footer="", retab=True):
+        """
+        Convert an experiment straight to an output file, streaming the items to it.
+        At most maxItems items are held in memory; beyond that they are spilled to
+        sorted temporary files and merged back while writing. Unless retab is False,
+        tabs are written as four spaces (see RetabWriter).
+        params:
+            * outfile:String - name of the file to be created/overwritten
+            * infile:String - name of the input tab-separated file
+            * dct:Dictionary - header dictionary from parse_config_file
+            * cache:ItemCache - optional cache of previously parsed rows
+            * maxItems:Int - number of items to buffer before spilling (default ITEM_BUFFER_SIZE)
+        """
+        timer = self.timer
+        sorter = ItemSorter(maxItems)
+        try:
+            if timer: timer.begin("items");
+            self.generate_item_dict(infile, cache, sorter)
+            if timer: timer.end(self.rowsRead);
+            if self.report is not None:
+                self.report.finish(self.qExitOpt)
+            if timer: timer.begin("header");
+            header = self.header(dct).render()
+            if timer: timer.end(len(self.criticals));
+            if timer: timer.begin("sort");
+            items = sorter.items()
+            if timer: timer.end();
+            if timer: timer.begin("write");
+            with open(outfile, 'w') as fout:
+                if retab: fout = RetabWriter(fout);
+                fout.write(header + "\n")
+                count = self.write_item_str(fout, items)
+                fout.write("\n" + footer + "\n")
+            if timer: timer.end(count);
+        finally:
+            sorter.close()
+        print "File '" + outfile + "' sucessfully created"
+
+    def write_variants(self, outfiles, infile, dct, cache=None, maxItems=None, footer="", retab=True):
+        """
+        Convert an experiment to several output files that differ only in their order
+        and filler modes. The items are generated, sorted and written once; every other
+        variant is its own header followed by a copy of that items block.
+        params:
+            * outfiles:List - (output file name, order, filler) tuples, as from variant_outputs
+            * infile, dct, cache, maxItems, footer, retab - as for write_outfile
+        """
+        import os
+        import shutil
+        timer = self.timer
+        sorter = ItemSorter(maxItems)
+        try:
+            if timer: timer.begin("items");
+            self.generate_item_dict(infile, cache, sorter)
+            if timer: timer.end(self.rowsRead);
+            if self.report is not None:
+                self.report.finish(self.qExitOpt)
+            if timer: timer.begin("header");
+            headers = [Header(order, filler, dct["defaults"], self.criticals).render() for name, order, filler in outfiles]
+            if timer: timer.end(len(outfiles));
+            if timer: timer.begin("sort");
+            items = sorter.items()
+            if timer: timer.end();
+            if timer: timer.begin("write");
+            done = set() #absolute paths, so a file listed twice is only written once
+            shared = None #(file name, offset) of the first items block written
+            for (outfile, order, filler), header in zip(outfiles, headers):
+                path = os.path.abspath(outfile)
+                if path in done: continue;
+                done.add(path)
+                with open(outfile, 'wb') as raw:
+                    fout = RetabWriter(raw) if retab else raw
+                    fout.write(header + "\n")
+                    if shared is None:
+                        shared = (outfile, raw.tell())
+                        count = self.write_item_str(fout, items)
+                        fout.write("\n" + footer + "\n")
+                    else:
+                        with open(shared[0], 'rb') as fin:
+                            fin.seek(shared[1])
+                            shutil.copyfileobj(fin, raw)
+                print "File '" + outfile + "' sucessfully created"
+            if timer: timer.end(count if shared else 0);
+        finally:
+            sorter.close()
+
+    def validate(self, infile, cache=None):
+        """
+        Run every check on an input file without keeping the items
+        return:
+            * the ValidationReport (a new one, unless this converter already has one)
+        """
+        if self.report is None: self.report = ValidationReport();
+        self.generate_item_dict(infile, cache, NullItems())
+        return self.report
+
+    def create_outfile(self, outfile, header, items, footer=""):
+        """
+        Write an output file, filling in this converter's critical item names
+        """
+        create_outfile(outfile, header, items, footer, self.criticals)
+
+    def convert(self, infile, config, cache=None):
+        """
+        Convert one experiment
+        params:
+            * infile:String - name of the input tab-separated file, or a list of row dictionaries
+            * config:String or Dictionary - config file name, or a dict from parse_config_file
+            * cache:ItemCache - optional cache of previously parsed rows (file input only)
+        return:
+            * String contents of the Ibex data file
+        """
+        if isinstance(config, basestring):
+            config = parse_config_file(config)
+        items = self.generate_item_str(infile, cache)
+        header = self.format_header(config)
+        return render_outfile(header, items, "", self.criticals)
+
+class _RowLog(object):
+    """
+    Stands in for a ValidationReport and an output dictionary in _generate_rows,
+    recording notes and items with the input row they came from
+    """
+    def __init__(self):
+        self.row = None #index of the row being generated
+        self.notes = []
+        self.items = []
+
+    def add(self, row, column, code, message, error=False):
+        self.notes.append((self.row, row, column, code, message, error))
+
+    def __setitem__(self, key, item):
+        self.items.append((self.row, key, item))
+
+def _generate_rows(args):
+    """
+    Pool worker: the generate_item_dict loop for the rows of one 'List'
+    params (one tuple):
+        * fieldnames:List - the input columns
+        * rows:Tuple - lists of the row indices, spreadsheet row numbers, stimulus IDs
+                       and lines of the rows
+        * option:String - qExit option (problems are only collected here)
+    return:
+        * Tuple (notes, items, criticals, lists): the notes and items from _RowLog,
+          (row index, name) of the first row of each critical type, and the set of lists
+    """
+    fieldnames, (indices, rowNums, ids, raws), option = args
+    width = len(fieldnames)
+    lines = []
+    for values in csv.reader(raws, delimiter='\t'):
+        line = dict(zip(fieldnames, values)) #the dictionary csv.DictReader would give
+        if len(values) > width: line[None] = values[width:];
+        elif len(values) < width:
+            for name in fieldnames[len(values):]: line[name] = None;
+        lines.append(line)
+    log = _RowLog()
+    def rowIDs():
+        for r, row, ID in zip(indices, rowNums, ids):
+            log.row = r
+            yield (row, ID)
+    converter = Converter(option, log)
+    converter.generate_item_dict(lines, None, log, rowIDs())
+    firsts = {}
+    for r, key, item in log.items:
+        firsts.setdefault(item.stimType, r)
+    criticals = [(firsts[name], name) for name in converter.criticals]
+    return (log.notes, log.items, criticals, converter.listSet)
+
+#the module-level functions share one converter whose state is the module globals
+_default = Converter()
+_default.criticals = Criticals
+_default.nonCriticals = Non_Criticals
+_default.listSet = ListSet
+
+
+# FORMAT RESULTS FILE *********************************************************************
+
+RESULTS_S_HEADER = "Timestamp\tIP_MD5\tSeq\tType\tWordNum\tWord\tTag\tReadTime\n"
+RESULTS_Q_HEADER = "Timestamp\tIP_MD5\tSeq\tType\tAnswerCorrect\n"
+RESULTS_BUFSIZE = 1 << 20
+RESULTS_CHUNK_SIZE = 1 << 22
+
+def results_rows(lines, state):
+    """
+    Number the sentence and question lines of an Ibex results file; every way of
+    formatting results (text, parallel shards, store, export) reads its rows from here
+    params:
+        * lines:Iterable - lines of an Ibex results file; blank and '#' lines are skipped
+        * state:List - [sSeq, qSeq, lastCtr] to continue numbering from, updated in
+          place once the lines are exhausted (or the generator closed)
+    return:
+        * Generator of (table, fields, seq): table is "sentences" or "questions", fields
+          the line split on its first 11 commas (the columns used are all among them)
+    """
+    sSeq, qSeq, lastCtr = state
+    try:
+        for line in lines:
+            if not line or line[0] == '#': continue;
+            s = line.split(",", 11)
+            controller = s[2]
+            if(controller == "RegionedSentence"):
+                ctr = int(s[7])
+                if(qSeq == sSeq): sSeq += 1;
+                elif(lastCtr > ctr): sSeq += 1;  qSeq+=1;
+
+                lastCtr = ctr
+                yield ("sentences", s, sSeq)
+            elif(controller == "Question"):
+                if(qSeq != sSeq): qSeq += 1;
+                yield ("questions", s, qSeq)
+            else:
+                print "Warning: Unrecognized Controller: %s" % (controller)
+    finally:
+        state[:] = [sSeq, qSeq, lastCtr]
+
+def format_results_lines(lines, sout, qout, state=(0, 0, 1)):
+    """
+    Format Ibex results lines one at a time, writing straight to the output handles
+    params:
+        * lines:Iterable - lines of an Ibex results file
+        * sout:File - writable handle for the sentence rows
+        * qout:File - writable handle for the question rows
+        * state:Tuple - (sSeq, qSeq, lastCtr) to continue numbering from
+    return:
+        * Tuple (sSeq, qSeq, lastCtr) after the last line
+    """
+    state = list(state)
+    swrite = sout.write
+    qwrite = qout.write
+    for table, s, seq in results_rows(lines, state):
+        if(table == "sentences"):
+            swrite("%s\t%s\t%d\t%s\t%s\t%s\t%s\t%s\n" % (s[0],s[1],seq,s[5],s[7],s[8],s[10],s[9]))
+        else:
+            qwrite("%s\t%s\t%d\t%s\t%s\n" % (s[0],s[1],seq,s[5],s[9]))
+    return tuple(state)
+
+def map_results_chunks(infile, start=0, end=None):
+    """
+    Yield the byte range [start, end) of a results file, memory-mapped, in chunks
+    of about RESULTS_CHUNK_SIZE bytes that end on line boundaries
+    """
+    import mmap
+    import os
+    with open(infile, 'rb') as fin:
+        if os.fstat(fin.fileno()).st_size == 0: return;
+        m = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if end is None: end = len(m);
+        pos = start
+        while pos < end:
+            stop = min(pos + RESULTS_CHUNK_SIZE, end)
+            if stop < end:
+                cut = m.rfind('\n', pos, stop) + 1
+                if cut > pos: stop = cut;
+                else: stop = (m.find('\n', stop, end) + 1) or end;
+            yield m[pos:stop]
+            pos = stop
+    finally:
+        m.close()
+
+def format_results_chunks(chunks, sout, qout, state=(0, 0, 1)):
+    """
+    Same as format_results_lines, but for large blocks of whole lines: each block's
+    rows are collected and written with one call per output file
+    return:
+        * Tuple (sSeq, qSeq, lastCtr) after the last line
+    """
+    state = list(state)
+    last, seq = None, "" #the Seq string is only formatted when it changes, once per sentence
+    for chunk in chunks:
+        srows = []
+        qrows = []
+        sappend = srows.append
+        qappend = qrows.append
+        #line ends are kept, as iterating a file does (Ibex encodes any line breaks within fields)
+        for table, s, n in results_rows(chunk.splitlines(True), state):
+            if(table == "sentences"):
+                if(n != last): last = n; seq = str(n);
+                sappend("%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n" % (s[0],s[1],seq,s[5],s[7],s[8],s[10],s[9]))
+            else:
+                qappend("%s\t%s\t%d\t%s\t%s\n" % (s[0],s[1],n,s[5],s[9]))
+        sout.write("".join(srows))
+        qout.write("".join(qrows))
+    return tuple(state)
+
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.xz', '.lzma')
+
+def open_results(filename, mode='r'):
+    """
+    Open a results file or a formatted output file, compressed or decompressed on
+    the fly according to its extension: .gz, .bz2, or .xz/.lzma (these need the
+    lzma module, from Python 3 or the backports.lzma package)
+    """
+    if filename.endswith('.gz'):
+        import gzip
+        return gzip.open(filename, mode + 'b')
+    if filename.endswith('.bz2'):
+        import bz2
+        return bz2.BZ2File(filename, mode, RESULTS_BUFSIZE)
+    if filename.endswith(('.xz', '.lzma')):
+        try:
+            import lzma
+        except ImportError:
+            try:
+                from backports import lzma
+            except ImportError:
+                print "\nERROR: '%s' needs the lzma module (pip install backports.lzma)\n" % (filename)
+                sys.exit(1)
+        return lzma.open(filename, mode + 'b')
+    return open(filename, mode, RESULTS_BUFSIZE)
+
+def read_results_chunks(infile):
+    """
+    Yield a results file in blocks of whole lines: memory-mapped if it is a plain
+    file, otherwise decompressed as it is read, without a temporary file
+    """
+    if not infile.endswith(COMPRESSED_SUFFIXES):
+        for chunk in map_results_chunks(infile):
+            yield chunk
+        return
+    with open_results(infile) as fin:
+        rest = ""
+        while True:
+            block = fin.read(RESULTS_CHUNK_SIZE)
+            if not block: break;
+            if rest: block = rest + block;
+            cut = block.rfind('\n') + 1
+            rest = block[cut:]
+            if cut: yield block[:cut];
+        if rest: yield rest;
+
+def expand_results_files(patterns):
+    """
+    Expand glob patterns (left to the shell on UNIX, but not on Windows or when quoted)
+    into a list of results files; a pattern matching nothing is kept as it is
+    """
+    import glob
+    files = []
+    for pattern in patterns:
+        files.extend(sorted(glob.glob(pattern)) or [pattern])
+    return files
+
+def format_results(infile, sfile='sentences.csv', qfile='questions.csv'):
+    """
+    Produce two tab-delimited files from the supplied results file(s)
+     - infile is a file name or a list of them, formatted in one pass in that order
+       with the Seq numbering continuing from one file to the next
+     - plain results files are memory-mapped and formatted a block at a time, and
+       compressed ones decompressed as they are read, so memory use stays flat;
+       the output files are compressed if their names end in .gz, .bz2 or .xz
+    """
+    if isinstance(infile, basestring): infile = [infile];
+    for name in infile:
+        check_file(name)
+        if name.endswith(COMPRESSED_SUFFIXES): open_results(name).close();
+
+    with open_results(sfile, 'w') as sout:
+        with open_results(qfile, 'w') as qout:
+            sout.write(RESULTS_S_HEADER)
+            qout.write(RESULTS_Q_HEADER)
+            state = (0, 0, 1)
+            for name in infile:
+                state = format_results_chunks(read_results_chunks(name), sout, qout, state)
+    print "File '%s' successfully written" % (sfile)
+    print "File '%s' successfully written" % (qfile)
+
+
+# FOLLOWING A LIVE RESULTS FILE *************************************************
+
+RESULTS_POLL_INTERVAL = 2.0
+
+def read_complete_lines(fin, consumed):
+    """
+    Yield the whole lines left in a file, stopping before a last line that is still
+    being written; the length of each line yielded is added to consumed[0]
+    """
+    for line in fin:
+        if line[-1] != '\n': break;
+        consumed[0] += len(line)
+        yield line
+
+def load_follow_state(statefile, infile):
+    """
+    Return the saved (offset, (sSeq, qSeq, lastCtr), (sentence file size, question
+    file size)) for a results file, or None if it has not been formatted before or
+    has been truncated/replaced since
+    """
+    import json
+    import os
+    try:
+        with open(statefile, 'r') as fin:
+            saved = json.load(fin)
+    except (IOError, ValueError):
+        return None
+    if saved.get("results") != os.path.abspath(infile) or saved["offset"] > os.path.getsize(infile):
+        return None
+    if "sizes" not in saved: return None; #from before the output sizes were kept
+    return (saved["offset"], tuple(saved["state"]), tuple(saved["sizes"]))
+
+def save_follow_state(statefile, infile, offset, state, sizes):
+    """
+    Record how far a results file has been formatted, and how long the output files
+    were then (see load_follow_state); written to a temporary file and renamed, so
+    an interrupted save leaves the previous state
+    """
+    import json
+    import os
+    with open(statefile + ".tmp", 'w') as fout:
+        json.dump({"results": os.path.abspath(infile), "offset": offset, "state": list(state),
+                   "sizes": list(sizes)}, fout)
+    if os.name == 'nt' and os.path.exists(statefile): os.remove(statefile);
+    os.rename(statefile + ".tmp", statefile)
+
+def follow_results(infile, sfile='sentences.csv', qfile='questions.csv', interval=None):
+    """
+    Format only the lines added to a results file since the last call, appending
+    them to the two output files
+     - the byte offset and Seq numbering state are kept in 'sfile.follow'; if that is
+       missing, or the results file was truncated, the output files are started over
+     - the output file sizes are kept there too, and the files cut back to them
+       before resuming, so the rows of a pass that was interrupted (Ctrl-C, or a
+       malformed line) are not appended twice
+     - with an interval, keep polling the results file every 'interval' seconds
+       until interrupted
+    return:
+        * Tuple (sSeq, qSeq, lastCtr) after the last line read
+    """
+    import os
+    import time
+    check_file(infile)
+    statefile = sfile + ".follow"
+    saved = load_follow_state(statefile, infile)
+    if saved is not None:
+        #outputs shorter than they were saved at have been changed by hand
+        for name, size in zip((sfile, qfile), saved[2]):
+            if not os.path.exists(name) or os.path.getsize(name) < size: saved = None;
+    if saved is None:
+        offset, state = 0, (0, 0, 1)
+        for name, header in ((sfile, RESULTS_S_HEADER), (qfile, RESULTS_Q_HEADER)):
+            with open(name, 'w') as fout: fout.write(header);
+    else:
+        offset, state, sizes = saved
+        for name, size in zip((sfile, qfile), sizes):
+            with open(name, 'r+b') as fout: fout.truncate(size);
+
+    while True:
+        if os.path.getsize(infile) > offset:
+            consumed = [offset]
+            with open(infile, 'r', RESULTS_BUFSIZE) as fin:
+                fin.seek(offset)
+                with open(sfile, 'a', RESULTS_BUFSIZE) as sout:
+                    with open(qfile, 'a', RESULTS_BUFSIZE) as qout:
+                        state = format_results_lines(read_complete_lines(fin, consumed), sout, qout, state)
+            if consumed[0] > offset:
+                print "Read %d new bytes of '%s'" % (consumed[0] - offset, infile)
+                offset = consumed[0]
+            save_follow_state(statefile, infile, offset, state, (os.path.getsize(sfile), os.path.getsize(qfile)))
+        if interval is None: break;
+        try:
+            time.sleep(interval)
+        except KeyboardInterrupt:
+            break
+    return state
+
+
+# PARALLEL RESULTS FORMATTING ***************************************************
+
+def read_results_range(infile, start, end):
+    """
+    Yield the lines of a results file that begin in the byte range [start, end)
+    """
+    with open(infile, 'r', RESULTS_BUFSIZE) as fin:
+        fin.seek(start)
+        pos = start
+        while pos < end:
+            line = fin.readline()
+            if line == "": break;
+            pos += len(line)
+            yield line
+
+def results_participant(line):
+    """
+    Return the (Timestamp, IP_MD5) pair of a results line, or None for comments
+    """
+    if line[0] == '#': return None;
+    return tuple(line.split(",", 2)[:2])
+
+def shard_results(infile, nshards):
+    """
+    Split a results file into roughly equal byte ranges along participant boundaries
+    params:
+        * infile:String - name of the results file
+        * nshards:Int - desired number of shards
+    return:
+        * List of (start, end) byte offsets; consecutive and covering the whole file
+    """
+    import os
+    size = os.path.getsize(infile)
+    bounds = [0]
+    with open(infile, 'r') as fin:
+        for n in range(1, nshards):
+            target = max(size * n // nshards, bounds[-1])
+            fin.seek(target)
+            if target > 0: fin.readline()  #skip to the start of the next line
+            pos = fin.tell()
+            last = None
+            while True:
+                line = fin.readline()
+                if line == "": pos = size; break;
+                key = results_participant(line)
+                if key is not None:
+                    if last is not None and key != last: break;
+                    last = key
+                pos += len(line)
+            if pos > bounds[-1] and pos < size:
+                bounds.append(pos)
+    bounds.append(size)
+    return zip(bounds[:-1], bounds[1:])
+
+def _results_shard_summary(args):
+    """
+    Pool worker: run the Seq state machine over one shard from a fresh state
+    return:
+        * Tuple (first, sSeq, qSeq, lastCtr) where first is None, ('Q',) or ('S', wordNum)
+          for the first sentence/question row, and lastCtr is None if no sentence was seen
+    """
+    infile, start, end = args
+    first = None
+    sSeq = qSeq = 0
+    lastCtr = None
+    for line in read_results_range(infile, start, end):
+        if (line[0] == '#'): continue;
+        s = line.split(",", 8)
+        if(s[2] == "RegionedSentence"):
+            ctr = int(s[7])
+            if first is None: first = ('S', ctr);
+            if(qSeq == sSeq): sSeq += 1;
+            elif(lastCtr > ctr): sSeq += 1;  qSeq+=1;
+            lastCtr = ctr
+        elif(s[2] == "Question"):
+            if first is None: first = ('Q',);
+            if(qSeq != sSeq): qSeq += 1;
+    return (first, sSeq, qSeq, lastCtr)
+
+def _chain_results_state(state, summary):
+    """
+    Given the serial (sSeq, qSeq, lastCtr) state before a shard and the shard's
+    summary from a fresh start, return the serial state after the shard
+    """
+    sSeq, qSeq, lastCtr = state
+    first, relS, relQ, relCtr = summary
+    if first is None: return state;
+    #a shard started fresh differs from the serial run only by a constant Seq offset,
+    # which is one less when its first sentence continues the previous sequence
+    offset = sSeq
+    if first[0] == 'S' and qSeq != sSeq and not lastCtr > first[1]:
+        offset -= 1
+    if relCtr is None: relCtr = lastCtr;
+    return (offset + relS, offset + relQ, relCtr)
+
+def _format_results_shard(args):
+    """
+    Pool worker: format one shard into sentence/question files in the run's temporary directory
+    """
+    import tempfile
+    infile, start, end, state, tmpdir = args
+    sfd, sname = tempfile.mkstemp(prefix='sentences.', dir=tmpdir)
+    qfd, qname = tempfile.mkstemp(prefix='questions.', dir=tmpdir)
+    import os
+    with os.fdopen(sfd, 'w', RESULTS_BUFSIZE) as sout:
+        with os.fdopen(qfd, 'w', RESULTS_BUFSIZE) as qout:
+            format_results_chunks(map_results_chunks(infile, start, end), sout, qout, state)
+    return (sname, qname)
+
+def format_results_parallel(infile, jobs, sfile='sentences.csv', qfile='questions.csv'):
+    """
+    Produce the same two files as format_results, using a pool of 'jobs' processes
+     - the input is split along participant (Timestamp/IP_MD5) boundaries
+     - each shard is scanned once to chain the Seq numbering between shards, then
+       formatted from its exact serial starting state and the pieces concatenated in order
+     - the pieces are written to a temporary directory beside the output files, which
+       is removed afterwards even if a worker fails
+    """
+    import os
+    import shutil
+    import tempfile
+    from multiprocessing import Pool
+
+    check_file(infile)
+    shards = shard_results(infile, jobs * 4)
+    tmpdir = tempfile.mkdtemp(prefix='.csv2ibex.', dir=os.path.dirname(os.path.abspath(sfile)))
+
+    try:
+        pool = Pool(jobs)
+        try:
+            summaries = pool.map(_results_shard_summary, [(infile, a, b) for a, b in shards])
+            states = []
+            state = (0, 0, 1)
+            for summary in summaries:
+                states.append(state)
+                state = _chain_results_state(state, summary)
+            pieces = pool.map(_format_results_shard,
+                              [(infile, a, b, st, tmpdir) for (a, b), st in zip(shards, states)])
+        finally:
+            pool.close()
+            pool.join()
+
+        with open_results(sfile, 'w') as sout:
+            with open_results(qfile, 'w') as qout:
+                sout.write(RESULTS_S_HEADER)
+                qout.write(RESULTS_Q_HEADER)
+                for sname, qname in pieces:
+                    with open(sname, 'r') as fin: shutil.copyfileobj(fin, sout, RESULTS_BUFSIZE);
+                    with open(qname, 'r') as fin: shutil.copyfileobj(fin, qout, RESULTS_BUFSIZE);
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    print "File '%s' successfully written" % (sfile)
+    print "File '%s' successfully written" % (qfile)
+
+
+# RESULTS STORE ****************************************************************
+
+RESULTS_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, path TEXT UNIQUE,
+    offset INTEGER, sseq INTEGER, qseq INTEGER, lastctr INTEGER);
+CREATE TABLE IF NOT EXISTS sentences (source INTEGER, Timestamp TEXT, IP_MD5 TEXT,
+    Seq INTEGER, Type TEXT, WordNum INTEGER, Word TEXT, Tag TEXT, ReadTime INTEGER);
+CREATE TABLE IF NOT EXISTS questions (source INTEGER, Timestamp TEXT, IP_MD5 TEXT,
+    Seq INTEGER, Type TEXT, AnswerCorrect INTEGER);
+CREATE INDEX IF NOT EXISTS s_ip ON sentences (IP_MD5);
+CREATE INDEX IF NOT EXISTS s_seq ON sentences (Seq);
+CREATE INDEX IF NOT EXISTS s_type_word ON sentences (Type, WordNum);
+CREATE INDEX IF NOT EXISTS q_ip ON questions (IP_MD5);
+CREATE INDEX IF NOT EXISTS q_seq ON questions (Seq);
+CREATE INDEX IF NOT EXISTS q_type ON questions (Type);
+"""
+
+#named queries for --query; anything else is run as SQL
+RESULTS_QUERIES = {
+    "participants": "SELECT path AS Results, IP_MD5, COUNT(DISTINCT Seq) AS Items FROM sentences " +\
+                    "JOIN sources ON sources.id = sentences.source GROUP BY source, IP_MD5 ORDER BY source, IP_MD5",
+    "readtimes": "SELECT Type, WordNum, COUNT(*) AS N, AVG(ReadTime) AS MeanReadTime FROM sentences " +\
+                 "GROUP BY Type, WordNum ORDER BY Type, WordNum",
+    "accuracy": "SELECT Type, COUNT(*) AS N, AVG(AnswerCorrect) AS Accuracy FROM questions " +\
+                "WHERE AnswerCorrect IN (0, 1) GROUP BY Type ORDER BY Type",
+}
+
+class ResultsStore(object):
+    """
+    Indexed SQLite copy of one or more Ibex results files, holding the same
+    sentence and question rows as format_results writes
+     - each results file remembers how far it has been read and its Seq numbering
+       state, so ingesting it again only adds the lines appended since
+     - the numbering continues from whatever was ingested last, as '-O' continues it
+       from one results file to the next
+    """
+    def __init__(self, filename):
+        import sqlite3
+        self.db = sqlite3.connect(filename)
+        self.db.executescript(RESULTS_STORE_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def ingest(self, infile):
+        """
+        Add the new complete lines of a results file to the store
+        return:
+            * Tuple (sentence rows, question rows) added
+        """
+        import os
+        check_file(infile)
+        path = os.path.abspath(infile)
+        db = self.db
+        row = db.execute("SELECT id, offset, sseq, qseq, lastctr FROM sources WHERE path = ?", (path,)).fetchone()
+        compressed = infile.endswith(COMPRESSED_SUFFIXES)
+        if row is not None and not compressed and row[1] > os.path.getsize(infile):
+            print "Warning: '%s' is shorter than when it was stored; reloading it" % (infile)
+            for table in ("sentences", "questions", "sources"):
+                db.execute("DELETE FROM %s WHERE %s = ?" % (table, "id" if table == "sources" else "source"), (row[0],))
+            row = None
+        #Seq only grows, so the furthest numbered source is the one ingested last
+        last = db.execute("SELECT sseq, qseq, lastctr FROM sources ORDER BY sseq DESC, qseq DESC LIMIT 1").fetchone()
+        state = list(last or (0, 0, 1))
+        if row is None:
+            source = db.execute("INSERT INTO sources (path, offset, sseq, qseq, lastctr) VALUES (?, 0, ?, ?, ?)",
+                                [path] + state).lastrowid
+            offset = 0
+        else:
+            source, offset = row[:2]
+
+        sentences = []
+        questions = []
+        consumed = [offset]
+        with open_results(infile) as fin:
+            fin.seek(offset) #compressed files are decompressed up to here
+            #a last line still being written is picked up next time
+            lines = (line.rstrip('\r\n') for line in read_complete_lines(fin, consumed))
+            for table, s, seq in results_rows(lines, state):
+                if(table == "sentences"):
+                    sentences.append((source, s[0], s[1], seq, s[5], s[7], s[8], s[10], s[9]))
+                else:
+                    questions.append((source, s[0], s[1], seq, s[5], s[9]))
+
+        with db:
+            db.executemany("INSERT INTO sentences VALUES (?,?,?,?,?,?,?,?,?)", sentences)
+            db.executemany("INSERT INTO questions VALUES (?,?,?,?,?,?)", questions)
+            db.execute("UPDATE sources SET offset = ?, sseq = ?, qseq = ?, lastctr = ? WHERE id = ?",
+                       [consumed[0]] + state + [source])
+        return (len(sentences), len(questions))
+
+    def query(self, sql, params=()):
+        """
+        Run a query against the store
+        params:
+            * sql:String - a name from RESULTS_QUERIES, or an SQL statement
+        return:
+            * Tuple (column names, list of rows)
+        """
+        cur = self.db.execute(RESULTS_QUERIES.get(sql, sql), params)
+        names = [d[0] for d in cur.description or ()]
+        return (names, cur.fetchall())
+
+def print_query(names, rows, fout=sys.stdout):
+    """
+    Write query results as tab-delimited lines with a header
+    """
+    fout.write("\t".join(names) + "\n")
+    for row in rows:
+        fout.write("\t".join(["NULL" if v is None else str(v) for v in row]) + "\n")
+
+
+# COLUMNAR EXPORT **************************************************************
+
+#(name, kind) for each exported column: "int" columns hold integers (EXPORT_NULL
+# where the value is missing or not a number), "str" columns are dictionary-encoded
+EXPORT_COLUMNS = {
+    "sentences": [("Timestamp", "int"), ("IP_MD5", "str"), ("Seq", "int"), ("Type", "str"),
+                  ("WordNum", "int"), ("Word", "str"), ("Tag", "str"), ("ReadTime", "int")],
+    "questions": [("Timestamp", "int"), ("IP_MD5", "str"), ("Seq", "int"), ("Type", "str"),
+                  ("AnswerCorrect", "int")],
+}
+EXPORT_NULL = -1
+EXPORT_HEADER_SIZE = 128 #bytes reserved for each .npy header, written once the length is known
+EXPORT_FLUSH = 1 << 16
+
+class ColumnWriter(object):
+    """
+    Streams one column to a NumPy .npy file (format 1.0) without needing NumPy:
+    integers are written as machine-size signed ints, strings as int32 codes into
+    a dictionary that is saved next to it, one value per line
+    """
+    def __init__(self, filename, kind):
+        import array
+        self.filename = filename
+        self.kind = kind
+        self.fout = open(filename, 'wb')
+        self.fout.write(" " * EXPORT_HEADER_SIZE)
+        self.typecode = 'l' if kind == "int" else 'i'
+        self.values = array.array(self.typecode)
+        self.count = 0
+        self.codes = {}
+        self.strings = []
+
+    def append(self, value):
+        if self.kind == "int":
+            try:
+                value = int(value)
+            except ValueError:
+                value = EXPORT_NULL
+        else:
+            try:
+                value = self.codes[value]
+            except KeyError:
+                self.strings.append(value)
+                value = self.codes[value] = len(self.strings) - 1
+        self.values.append(value)
+        if len(self.values) >= EXPORT_FLUSH: self.flush();
+
+    def flush(self):
+        import array
+        self.values.tofile(self.fout)
+        self.count += len(self.values)
+        self.values = array.array(self.typecode)
+
+    def dtype(self):
+        return ('<' if sys.byteorder == 'little' else '>') + 'i%d' % (self.values.itemsize)
+
+    def close(self):
+        """
+        Finish the file, and write the dictionary of a string column
+        return:
+            * Dictionary describing the column, for the export's columns.json
+        """
+        self.flush()
+        header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (self.dtype(), self.count)
+        header = "\x93NUMPY\x01\x00" + chr((EXPORT_HEADER_SIZE - 10) % 256) + chr((EXPORT_HEADER_SIZE - 10) // 256) +\
+            header.ljust(EXPORT_HEADER_SIZE - 11) + "\n"
+        self.fout.seek(0)
+        self.fout.write(header)
+        self.fout.close()
+        import os
+        info = {"file": os.path.basename(self.filename), "dtype": self.dtype()}
+        if self.kind == "str":
+            info["dictionary"] = os.path.basename(self.filename)[:-len(".npy")] + ".dict"
+            with open(self.filename[:-len(".npy")] + ".dict", 'wb') as fout:
+                fout.write("".join([s + "\n" for s in self.strings]))
+        return info
+
+def export_results(infiles, outdir):
+    """
+    Write the sentence and question rows of one or more results files (numbered as
+    format_results numbers them) as typed column files, one directory per table:
+     - outdir/sentences/ReadTime.npy etc. can be memory-mapped with numpy.load(f, mmap_mode='r')
+     - string columns hold codes into the values listed, one per line, in the .dict file
+     - outdir/columns.json lists the row counts, files, dtypes and dictionaries
+    return:
+        * Dictionary {table: row count}
+    """
+    import json
+    import os
+    if isinstance(infiles, basestring): infiles = [infiles];
+    for name in infiles:
+        check_file(name)
+    writers = {}
+    for table, columns in EXPORT_COLUMNS.items():
+        if not os.path.isdir(os.path.join(outdir, table)):
+            os.makedirs(os.path.join(outdir, table))
+        writers[table] = [ColumnWriter(os.path.join(outdir, table, name + ".npy"), kind)
+                          for name, kind in columns]
+    sappend = [w.append for w in writers["sentences"]]
+    qappend = [w.append for w in writers["questions"]]
+    state = [0, 0, 1]
+    counts = {"sentences": 0, "questions": 0}
+    for infile in infiles:
+        for chunk in read_results_chunks(infile):
+            lines = (line.rstrip('\r') for line in chunk.split("\n"))
+            for table, s, seq in results_rows(lines, state):
+                if(table == "sentences"):
+                    for append, value in zip(sappend, (s[0], s[1], seq, s[5], s[7], s[8], s[10], s[9])):
+                        append(value)
+                else:
+                    for append, value in zip(qappend, (s[0], s[1], seq, s[5], s[9])):
+                        append(value)
+                counts[table] += 1
+
+    manifest = {}
+    for table, columns in EXPORT_COLUMNS.items():
+        manifest[table] = {"rows": counts[table], "null": EXPORT_NULL, "columns":
+                           [dict(w.close(), name=name) for w, (name, kind) in zip(writers[table], columns)]}
+    with open(os.path.join(outdir, "columns.json"), 'w') as fout:
+        json.dump(manifest, fout, indent=1, sort_keys=True)
+    print "Exported %d sentence and %d question rows to '%s'" % (counts["sentences"], counts["questions"], outdir)
+    return counts
+
+def load_export(outdir, table):
+    """
+    Read an exported table back without NumPy
+    return:
+        * Dictionary {column name: array of ints, or list of strings}
+    """
+    import array
+    import json
+    import os
+    with open(os.path.join(outdir, "columns.json"), 'r') as fin:
+        info = json.load(fin)[table]
+    data = {}
+    for column in info["columns"]:
+        values = array.array('l' if column["dtype"][2:] == str(array.array('l').itemsize) else 'i')
+        with open(os.path.join(outdir, table, column["file"]), 'rb') as fin:
+            fin.seek(EXPORT_HEADER_SIZE)
+            values.fromfile(fin, info["rows"])
+        if "dictionary" in column:
+            with open(os.path.join(outdir, table, column["dictionary"]), 'rb') as fin:
+                strings = fin.read().split("\n")[:-1]
+            values = [strings[v] for v in values]
+        data[column["name"]] = values
+    return data
+
+
+# BATCH CONVERSION *********************************************************************
+
+def read_manifest(manifest, defaultConfig):
+    """
+    Read a batch manifest: one experiment per line, tab-delimited as
+      INPUT_FILE [CONFIG_FILE [OUTPUT_FILE]]
+     - blank lines and lines starting with '#' are ignored
+     - a missing or '-' config uses defaultConfig; a missing or '-' output
+       file is the input file name with a '.js' extension
+    return:
+        * List of (infile, config, outfile) tuples
+    """
+    import os
+    jobs = []
+    with open(manifest, 'r') as fin:
+        for line in fin:
+            fields = line.rstrip("\r\n").split("\t")
+            if fields[0].strip() == "" or fields[0][0] == '#': continue;
+            fields = [f.strip() for f in fields] + ["-", "-"]
+            infile, config, outfile = fields[:3]
+            if config == "-": config = defaultConfig;
+            if outfile == "-": outfile = os.path.splitext(infile)[0] + ".js";
+            jobs.append((infile, config, outfile))
+    return jobs
+
+def find_batch_jobs(spec, defaultConfig):
+    """
+    Work out the experiments to convert from a manifest file, a directory
+    (all '*.csv' files in it) or a glob pattern of input files
+    return:
+        * List of (infile, config, outfile) tuples
+    """
+    import glob
+    import os
+    if os.path.isfile(spec):
+        return read_manifest(spec, defaultConfig)
+    if os.path.isdir(spec):
+        spec = os.path.join(spec, "*.csv")
+    return [(f, defaultConfig, os.path.splitext(f)[0] + ".js") for f in sorted(glob.glob(spec))]
+
+def _convert_job(args):
+    """
+    Pool worker: convert one experiment, reporting failure instead of raising
+    return:
+        * Tuple (infile, outfile, error message or None, seconds, printed messages)
+    """
+    import StringIO
+    import time
+    infile, dct, outfile, exitOpt = args
+    start = time.time()
+    error = None
+    saved = sys.stdout
+    sys.stdout = messages = StringIO.StringIO() #keep each experiment's warnings together
+    try:
+        try:
+            Converter(exitOpt).write_outfile(outfile, infile, dct)
+        except SystemExit:
+            error = "stopped (see messages above)"
+        except Exception, e:
+            error = "%s: %s" % (e.__class__.__name__, e)
+    finally:
+        sys.stdout = saved
+    return (infile, outfile, error, time.time() - start, messages.getvalue())
+
+def convert_batch(jobs, configure=None, processes=1, exitOpt="AUTOCONTINUE"):
+    """
+    Convert many experiments in one process, or a pool of them, printing each
+    experiment's messages as it finishes
+    params:
+        * jobs:List - (infile, config file, outfile) tuples
+        * configure:Function - optional callback applied to each parsed config dictionary
+        * processes:Int - number of worker processes
+        * exitOpt:String - qExit policy for every experiment (prompting is not possible here)
+    return:
+        * List of (infile, outfile, error message or None, seconds) tuples, in job order
+    """
+    configs = {}
+    tasks = []
+    for infile, config, outfile in jobs:
+        if config not in configs: #each distinct config file is only parsed once
+            configs[config] = parse_config_file(config)
+            if configure is not None: configure(configs[config]);
+        tasks.append((infile, configs[config], outfile, exitOpt))
+
+    pool = None
+    if processes > 1:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+        done = pool.imap(_convert_job, tasks, 1)
+    else:
+        done = (_convert_job(t) for t in tasks)
+    results = []
+    try:
+        for infile, outfile, error, secs, messages in done:
+            print "== %s" % (infile)
+            sys.stdout.write(messages)
+            results.append((infile, outfile, error, secs))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return results
+
+def print_batch_summary(results, seconds):
+    """
+    Report the failed experiments and the overall throughput of a batch
+    """
+    import os
+    failed = [r for r in results if r[2] is not None]
+    for infile, outfile, error, secs in failed:
+        print "FAILED: '%s' -> '%s': %s" % (infile, outfile, error)
+    size = sum([os.path.getsize(r[0]) for r in results if r[2] is None])
+    print "Converted %d of %d experiments (%d failed) in %.2fs wall time" % \
+        (len(results) - len(failed), len(results), len(failed), seconds)
+    if seconds > 0:
+        print "Throughput: %.1f experiments/s, %.2f MB/s of input" % \
+            (len(results) / seconds, size / seconds / 1e6)
+
+
+# CONVERSION SERVER ********************************************************************
+
+SERVER_HOST = "127.0.0.1"
+SERVER_LATENCY_WINDOW = 10000 #requests kept per endpoint for the latency percentiles
+
+def _serve_job(args):
+    """
+    Pool worker for the conversion server: convert stimuli or format results,
+    capturing the messages printed along the way
+    return:
+        * Tuple (output, printed messages, error message or None)
+    """
+    import cStringIO
+    import StringIO
+    kind, payload, infile, dct, exitOpt = args
+    output = None
+    error = None
+    saved = sys.stdout
+    sys.stdout = messages = StringIO.StringIO()
+    try:
+        try:
+            if kind == "convert":
+                if infile is None:
+                    payload = list(csv.DictReader(cStringIO.StringIO(payload), delimiter='\t'))
+                output = Converter(exitOpt).convert(infile or payload, dct)
+                output = output.replace('\t', '    ') #as write_outfile's RetabWriter does
+            else:
+                if infile is not None:
+                    check_file(infile)
+                    chunks = map_results_chunks(infile)
+                else:
+                    chunks = [payload]
+                sout = cStringIO.StringIO()
+                qout = cStringIO.StringIO()
+                sout.write(RESULTS_S_HEADER)
+                qout.write(RESULTS_Q_HEADER)
+                format_results_chunks(chunks, sout, qout)
+                output = {"sentences": sout.getvalue(), "questions": qout.getvalue()}
+        except SystemExit:
+            error = "stopped (see messages)"
+        except Exception, e:
+            error = "%s: %s" % (e.__class__.__name__, e)
+    finally:
+        sys.stdout = saved
+    return (output, messages.getvalue(), error)
+
+def _ignore_interrupts():
+    """
+    Pool initializer: leave Ctrl-C to the parent, which shuts the pool down
+    """
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a non-empty list of numbers
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def make_server(port, configfile="default_cfg", processes=1, exitOpt="AUTOCONTINUE", cachedir=None):
+    """
+    Build a local HTTP server that keeps parsed configs and a pool of worker
+    processes warm between requests. All replies are JSON:
+     - POST /convert: the body is a tab-delimited stimulus file (or give ?input=PATH);
+       ?config=FILE, ?order=... and ?filler=... override the defaults.
+       Replies {"output": data.js contents, "messages": ..., "seconds": ...}
+     - POST /results: the body is an Ibex results file (or give ?input=PATH).
+       Replies {"output": {"sentences": ..., "questions": ...}, ...}
+     - GET /stats: request counts and p50/p99 latency for each endpoint
+    Failures reply with status 400 and {"error": ..., "messages": ...}
+    params:
+        * port:Int - port to listen on, on localhost only
+        * processes:Int - number of worker processes
+    return:
+        * the server; call serve_forever(), and server_close() when done
+    """
+    import BaseHTTPServer
+    import collections
+    import json
+    import SocketServer
+    import threading
+    import time
+    import urlparse
+    from multiprocessing import Pool
+
+    class ConversionHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def reply(self, status, data):
+            body = json.dumps(data)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlparse.urlparse(self.path).path != "/stats":
+                return self.reply(404, {"error": "unknown path"})
+            self.reply(200, self.server.latency_stats())
+
+        def do_POST(self):
+            start = time.time()
+            url = urlparse.urlparse(self.path)
+            kind = url.path.strip("/")
+            if kind not in ("convert", "results"):
+                return self.reply(404, {"error": "unknown path"})
+            query = dict([(k, v[-1]) for k, v in urlparse.parse_qs(url.query).items()])
+            payload = self.rfile.read(int(self.headers.getheader("Content-Length") or 0))
+            dct = None
+            if kind == "convert":
+                name = query.get("config") or self.server.configfile
+                try:
+                    dct = self.server.config(name)
+                except (IOError, OSError, SystemExit): #check_file exits on a missing file
+                    return self.reply(400, {"error": "unable to read config file '%s'" % (name)})
+                for key in ("order", "filler"):
+                    if key in query: dct[key] = query[key];
+            output, messages, error = self.server.pool.apply(
+                _serve_job, ((kind, payload, query.get("input"), dct, self.server.exitOpt),))
+            seconds = time.time() - start
+            self.server.record(kind, seconds)
+            if error is not None:
+                return self.reply(400, {"error": error, "messages": messages})
+            self.reply(200, {"output": output, "messages": messages, "seconds": seconds})
+
+        def log_message(self, format, *args):
+            pass #latency is collected for /stats instead
+
+    class ConversionServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+        daemon_threads = True
+        pool = None
+
+        def config(self, name):
+            #parse_config_file only rereads a config file if it changed
+            return parse_config_file(name, self.cachedir)
+
+        def record(self, kind, seconds):
+            with self.lock:
+                self.latency.setdefault(kind, collections.deque(maxlen=SERVER_LATENCY_WINDOW)).append(seconds)
+                self.counts[kind] = self.counts.get(kind, 0) + 1
+
+        def latency_stats(self):
+            with self.lock:
+                return dict([(kind, {"count": self.counts[kind],
+                                     "p50": percentile(times, 0.50),
+                                     "p99": percentile(times, 0.99)})
+                             for kind, times in self.latency.items()])
+
+        def server_close(self):
+            BaseHTTPServer.HTTPServer.server_close(self)
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+
+    pool = Pool(processes, _ignore_interrupts) #before binding, so workers don't hold the socket
+    try:
+        server = ConversionServer((SERVER_HOST, port), ConversionHandler)
+    except:
+        pool.terminate()
+        raise
+    server.pool = pool
+    server.configfile = configfile
+    server.cachedir = cachedir
+    server.exitOpt = exitOpt
+    server.lock = threading.Lock()
+    server.latency = {}
+    server.counts = {}
+    server.config(configfile) #parse the default config before the first request
+    return server
+
+def print_latency(stats):
+    """
+    Print the per-endpoint request counts and latency percentiles of a server
+    """
+    for kind in sorted(stats):
+        s = stats[kind]
+        print "%-8s %8d requests   p50 %8.1f ms   p99 %8.1f ms" % \
+            (kind, s["count"], s["p50"] * 1000, s["p99"] * 1000)
+
+
+def set_force_continue(option, opt_str, value, parser):
+    """
+    A callback for optparse
+    """
+    global qExitOpt
+    qExitOpt = "AUTOCONTINUE"
+
+
+def set_strict(option, opt_str, value, parser):
+    """
+    A callback for optparse
+    """
+    global qExitOpt
+    qExitOpt = "AUTOFAIL"
+
+def finish_instrumentation(timer, profiler, trace=None, profile=None):
+    """
+    Report the --timings/--trace phases and the --profile statistics at the end of a run
+    """
+    if profiler is not None:
+        profiler.disable()
+        import pstats
+        profiler.dump_stats(profile)
+        print "\nProfile written to '%s'; the most expensive calls were:" % (profile)
+        pstats.Stats(profile).sort_stats("cumulative").print_stats(15)
+    if timer is not None:
+        if timer.current is not None: timer.end(); #stopped part way through a phase
+        print
+        timer.print_report()
+        if trace: timer.write_json(trace);
+
+def apply_ordering(dct, options):
+    """
+    Override the filler and order settings of a parsed config from the command line flags
+    """
+    if not options.fillerin:
+        dct["filler"] = "SEP_EACH"
+    else:
+        dct["filler"] = "ITEM"
+
+    if options.randomize or options.shuffle:
+        if options.shuffle:
+            if options.randomize:
+                dct["order"] = "RSHUFFLE"
+            else: dct["order"] = "SHUFFLE"
+        else:
+            if options.randomize:
+                dct["order"] = "RANDOMIZE"
+            else:
+                dct["order"] = "ORDERED"
+
+# USER INTERFACE *********************************************************************
+
+def make_parser():
+    """
+    Build the command line parser (optparse is only imported for the command line)
+    """
+    from optparse import OptionParser
+
+    usageStr= "\t%prog [PARAMETERS] INPUT_FILE OUTPUT_FILE\n" +\
+          "or:\t %prog -c CONFIG_FILE [MORE PARAMETERS] [INPUT_FILE OUTPUT_FILE]\n" +\
+          "or:\t %prog --variants all|ORDER[:FILLER],... [MORE PARAMETERS] INPUT_FILE OUTPUT_FILE\n" +\
+          "or:\t %prog -O [RESULTS_FILE|GLOB ... (default 'results')]\n" +\
+          "or:\t %prog -b MANIFEST|DIRECTORY|GLOB [-c CONFIG_FILE] [-j JOBS]\n" +\
+          "or:\t %prog --store DATABASE -O [RESULTS_FILE] | -q QUERY\n" +\
+          "or:\t %prog --serve PORT [-c CONFIG_FILE] [-j JOBS]\n" +\
+          "or:\t %prog --help"
+    parser = OptionParser(prog="csv2ibex.py", usage=usageStr,
+                          description="IBEX Input File Converter: " +\
+                                      "Converts a tab-delimited CSV file to a JavaScript input file " +\
+                                      "for Ibex.\n",
+                          epilog="Author: Andrew Wood <andywood@vt.edu>",
+                          version="%prog 0.9.5")
+
+    parser.add_option("-b", "--batch", dest="batch", default=None,
+                  help="Convert every experiment in a manifest file, directory or glob of input files")
+    parser.add_option("--cache", dest="cachedir", default=None,
+                  help="Cache parsed rows in this directory and only re-parse rows that changed")
+    parser.add_option("-c", "--config", dest="configfile", default="default_cfg",
+                  help="Use a custom config file")
+    parser.add_option("--columnar", action="store_true", dest="columnar", default=False,
+                  help="Read the input a column at a time (faster for large inputs; ignored with --cache)")
+    parser.add_option("-d", "--defaults", action="store_true", dest="defaults",
+                  default=True, help="Use default in-out files")
+    parser.add_option("--export", dest="export", default=None,
+                      help="With -O, write the rows as typed column files (NumPy .npy) in this directory instead")
+    parser.add_option("-f", "--fillernormal", action="store_true", default=False,
+                      dest="fillerin", help = "Treat Fillers as a normal item")
+    parser.add_option("-F", "--force", action="callback", callback=set_force_continue,
+                      help="Ignore warnings and continue")
+    parser.add_option("--follow", action="store_true", dest="follow", default=False,
+                      help="With -O, keep watching the results file and append new rows as they arrive (implies -u)")
+    parser.add_option("-j", "--jobs", type="int", dest="jobs", default=1,
+                      help="Number of processes to use in conversion, 'Format Output' and batch modes")
+    parser.add_option("-n", "--nothing", action="store_true", dest="doNothing", default=False,
+                      help="Stop after parsing arguments")
+    parser.add_option("-O", "--outputformat", action="store_true", dest="outputFmtMode", default=False,
+                      help="Run in 'Format Output' mode: make the Ibex results file more readable")
+    parser.add_option("--profile", dest="profile", default=None,
+                      help="Profile the run with cProfile, saving the statistics to this file and printing a summary")
+    parser.add_option("-p", "--prompt", action="store_true", dest="prompt", default=False,
+                      help="Prompt the user for any missing information")
+    parser.add_option("-q", "--query", dest="query", default=None,
+                      help="Print the result of an SQL query, or of one of the named queries " +\
+                           ", ".join(sorted(RESULTS_QUERIES)) + ", against the --store database")
+    parser.add_option("-r", "--randomize", action="store_true", dest="randomize", default=False,
+                      help="Randomize items of each type (don't use if you hard coded an ordering)")
+    parser.add_option("-s", "--shuffle", action="store_true", dest="shuffle", default=False,
+                      help="Shuffle (evenly space) the different types of items")
+    parser.add_option("-t", "--timings", action="store_true", dest="timings", default=False,
+                      help="Print the time, rows handled and peak memory of each phase of the run")
+    parser.add_option("--trace", dest="trace", default=None,
+                      help="Save the --timings phases to this file as JSON (implies -t)")
+    parser.add_option("-u", "--update", action="store_true", dest="update", default=False,
+                      help="With -O, only format the lines added since the last -u run, appending them to the output files")
+    parser.add_option("--report", dest="report", default=None,
+                      help="Collect input problems into a report file (.json or tab-delimited) instead of prompting for each one")
+    parser.add_option("--variants", dest="variants", default=None,
+                      help="Write one output file per order and filler mode from a single pass over the input: " +\
+                           "'all', or a list such as SHUFFLE:ITEM,RSHUFFLE (OUTPUT_FILE data.js gives data-shuffle-item.js, ...)")
+    parser.add_option("-V", "--validate", action="store_true", dest="validate", default=False,
+                      help="Only check the input file and report problems; no output file is written")
+    parser.add_option("--questions", dest="questions", default="questions.csv",
+                      help="With -O, write the question rows to this file (default questions.csv; " +\
+                           "compressed if it ends in .gz, .bz2 or .xz)")
+    parser.add_option("--sentences", dest="sentences", default="sentences.csv",
+                      help="With -O, write the sentence rows to this file (default sentences.csv; " +\
+                           "compressed if it ends in .gz, .bz2 or .xz)")
+    parser.add_option("--serve", type="int", dest="serve", default=None,
+                      help="Run a conversion server on this localhost port, keeping configs and -j worker processes warm")
+    parser.add_option("--store", dest="store", default=None,
+                      help="With -O, add the results to this indexed database instead of writing " +\
+                           "sentences.csv/questions.csv; only lines new since the last run are read")
+    parser.add_option("-S", "--strict", action="callback", callback=set_strict,
+                      help="Strict: will automatically stop if an error is encountered")
+    return parser
+
+def main(argv=None):
+    """
+    Run the command line interface
+    params:
+        * argv:List - the command line arguments (default: sys.argv[1:])
+    Importing the module and calling main() runs the same as the script, without
+    compiling the script's source on every run (see "faster startup" in the README)
+    """
+    parser = make_parser()
+    (options, args) = parser.parse_args(argv)
+
+    timer = None
+    if options.timings or options.trace:
+        timer = PhaseTimer()
+    profiler = None
+    if options.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if timer or profiler:
+        import atexit
+        atexit.register(finish_instrumentation, timer, profiler, options.trace, options.profile)
+
+    #server mode
+    if options.serve:
+        exitOpt = qExitOpt
+        if exitOpt == "PROMPT": exitOpt = "AUTOCONTINUE";
+        server = make_server(options.serve, options.configfile, options.jobs, exitOpt, options.cachedir)
+        print "Serving on http://%s:%d/ with %d worker(s); Ctrl-C to stop" % (SERVER_HOST, options.serve, options.jobs)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        server.server_close()
+        print_latency(server.latency_stats())
+        sys.exit(0)
+
+    #batch mode
+    if options.batch:
+        import time
+        exitOpt = qExitOpt
+        if exitOpt == "PROMPT": exitOpt = "AUTOCONTINUE";
+        start = time.time()
+        if timer: timer.begin("batch");
+        results = convert_batch(find_batch_jobs(options.batch, options.configfile),
+                                lambda dct: apply_ordering(dct, options), options.jobs, exitOpt)
+        if timer: timer.end(len(results));
+        print_batch_summary(results, time.time() - start)
+        sys.exit(int(any([r[2] is not None for r in results])))
+
+    #query the results store
+    if options.query:
+        if not options.store:
+            parser.error("--query needs --store")
+        store = ResultsStore(options.store)
+        print_query(*store.query(options.query))
+        store.close()
+        sys.exit(0)
+
+    infile = None
+    outfile = None
+    if len(args) == 2:
+        infile = args[0]
+        outfile = args[1]
+    elif len(args) == 1 and options.validate:
+        infile = args[0]
+    elif options.outputFmtMode:
+        pass #any number of results files
+    else:
+        if not options.prompt:
+            parser.print_usage()
+            sys.exit(-1)
+
+    #format output mode
+    if(options.outputFmtMode):
+        infiles = expand_results_files(args or ["results"])
+        if timer: timer.begin("results");
+        if options.store:
+            store = ResultsStore(options.store)
+            for infile in infiles:
+                print "Added %d sentence and %d question rows from '%s' to '%s'" % \
+                    (store.ingest(infile) + (infile, options.store))
+            store.close()
+        elif options.export:
+            export_results(infiles, options.export)
+        elif options.update or options.follow:
+            if len(infiles) != 1:
+                parser.error("-u and --follow take one results file")
+            if any(name.endswith(COMPRESSED_SUFFIXES) for name in infiles + [options.sentences, options.questions]):
+                parser.error("-u and --follow only append to uncompressed files")
+            follow_results(infiles[0], options.sentences, options.questions,
+                           RESULTS_POLL_INTERVAL if options.follow else None)
+        elif options.jobs > 1 and len(infiles) == 1 and not infiles[0].endswith(COMPRESSED_SUFFIXES):
+            format_results_parallel(infiles[0], options.jobs, options.sentences, options.questions)
+        else:
+            format_results(infiles, options.sentences, options.questions)
+        if timer: timer.end();
+        sys.exit(0)
+
+    report = None
+    if options.report or options.validate:
+        report = ValidationReport(options.report)
+
+    #validation only (the config is only needed for the default input file)
+    if options.validate:
+        if infile == None:
+            infile = parse_config_file(options.configfile)["inputfile"]
+        cache = None
+        if options.cachedir:
+            cache = ItemCache(options.cachedir, infile)
+        converter = Converter(qExitOpt, report, options.columnar, jobs=options.jobs)
+        if timer: timer.begin("validate");
+        converter.validate(infile, cache)
+        if timer: timer.end(converter.rowsRead);
+        report.finish()
+        sys.exit(int(report.errors() > 0))
+
+    orderChanged = False
+    #handle defaults
+    if not options.defaults:
+        if(options.prompt): #(gather this info via command prompts)
+            if(options.configfile == "default_cfg"):
+                options.configfile = raw_input("Enter the name of your custom config file, or simply hit enter to continue with prompts:")
+                if(options.configfile == ""):
+                    options.configfile = "default_cfg"
+            if(options.infile == None or configfile == "default_cfg"):
+                options.infile = raw_input("Enter the name of your input file (required): ")
+                check_file(options.infile)
+            if(outfile == None or options.configfile == "default_cfg"):
+                outfile = raw_input("Enter the desired output file name [data.js]: ")
+                if(options.outfile == ""):
+                    outfile="data.js"
+            if(options.configfile == "default_cfg"):
+                if( (raw_input("Evenly space different item types? \nUse this option unless you have specified an order for all items (y/n)")) == 'y'):
+                    options.shuffle = True
+                if( (raw_input("Randomize items? \nIMPORTANT: Only use this option if you did not specify an order! (y/n)")) == 'y'):
+                    options.randomize = True
+                if( (raw_input("Separate all items with a filler? If no, fillers are treated as normal items. (y/n)")) == 'n'):
+                    options.fillerin = False
+
+    if (options.randomize or options.shuffle):
+        orderChanged = True
+
+    dct = {}
+    if timer: timer.begin("config");
+    dct = parse_config_file(options.configfile, options.cachedir)
+    if timer: timer.end();
+
+    #figure out appropriate ordering variables
+    apply_ordering(dct, options)
+
+    if infile == None:
+        infile = dct["inputfile"];
+    if outfile == None:
+        outfile = dct["outputfile"];
+    else:
+        dct["outputfile"] = outfile;
+
+    variants = None
+    if options.variants:
+        try:
+            variants = variant_outputs(options.variants, outfile, dct["filler"])
+        except ValueError, e:
+            parser.error("--variants: %s" % (e))
+
+    cache = None
+    if options.cachedir:
+        cache = ItemCache(options.cachedir, infile)
+    converter = Converter(qExitOpt, report, options.columnar, timer, options.jobs)
+
+    #debug the cmd-line processor
+    if options.doNothing:
+        items = converter.generate_item_str(infile, cache)
+        header = converter.format_header(dct)
+        print "doing nothing:\ninput_file: " +infile+ "\noutput_file: " +outfile+ \
+        "\nconfig_file: " +str(options.configfile)+"\nOrderChanged? "+str(orderChanged) \
+        +"\nShuffle? "+str(options.shuffle)+"\nRandomize? "+str(options.randomize)+"\nFiller as normal item? " \
+        +str(not options.fillerin) +"\n\n"+header+"\n"+items
+        sys.exit(0)
+    elif variants:
+        converter.write_variants(variants, infile, dct, cache)
+    else:
+        converter.write_outfile(outfile, infile, dct, cache)
+
+if __name__=="__main__":
+    main()